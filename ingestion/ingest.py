@@ -7,12 +7,14 @@ import os
 import sys
 import uuid
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any
 
 import psycopg2
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct
-from sentence_transformers import SentenceTransformer
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -47,6 +49,9 @@ def get_qdrant_client():
 
 def load_embedding_model():
     """Load the embedding model"""
+    # Imported here so --help and argument errors don't pay for loading torch
+    from sentence_transformers import SentenceTransformer
+    
     model_name = os.getenv("E5_MODEL_NAME", "intfloat/e5-base-v2")
     print(f"Loading embedding model: {model_name}...")
     model = SentenceTransformer(model_name)
@@ -122,7 +127,7 @@ def insert_resource(conn, resource: Dict[str, Any], skill_ids: List[str]) -> str
     return resource_id
 
 
-def generate_embedding(model: SentenceTransformer, resource: Dict[str, Any]) -> List[float]:
+def generate_embedding(model: "SentenceTransformer", resource: Dict[str, Any]) -> List[float]:
     """Generate embedding for a resource"""
     # Combine title and description for embedding
     text = resource["title"]
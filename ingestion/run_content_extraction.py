@@ -76,7 +76,7 @@ class ContentExtractionPipeline:
             # Step 2: Upload to S3 (if not dry run)
             if self.dry_run:
                 logger.info(f"  [DRY RUN] Would upload to S3")
-                s3_key = f"snippets/{resource_id}.txt"
+                s3_key = self.uploader.get_s3_key_for_resource(resource_id)
             else:
                 s3_key = self.uploader.upload_snippet(resource_id, content)
                 
@@ -2,6 +2,7 @@
 S3 uploader module for content snippets
 Uploads extracted content to S3 for quiz generation
 """
+import hashlib
 import logging
 import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
@@ -78,8 +79,25 @@ class S3Uploader:
                 return False
     
     def get_s3_key_for_resource(self, resource_id: str) -> str:
-        """Generate S3 key for resource snippet"""
-        return f"snippets/{resource_id}.txt"
+        """Generate S3 key for resource snippet (hash-sharded, matches the RAG service)"""
+        h = hashlib.blake2s(resource_id.encode(), digest_size=2).hexdigest()
+        return f"snippets/{h[:2]}/{h[2:4]}/{resource_id}.txt"
+    
+    def copy_snippet(self, old_key: str, new_key: str) -> bool:
+        """Copy a snippet to a new key within the bucket"""
+        if not self.s3_client:
+            return False
+        
+        try:
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=new_key,
+                CopySource={'Bucket': self.bucket_name, 'Key': old_key}
+            )
+            return True
+        except ClientError as e:
+            logger.error(f"Failed to copy {old_key} to {new_key}: {e}")
+            return False
     
     def upload_snippet(self, resource_id: str, content: str) -> Optional[str]:
         """
@@ -6,7 +6,10 @@ import sys
 from pathlib import Path
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PayloadSchemaType
+from qdrant_client.models import (
+    Distance, VectorParams, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType
+)
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -24,6 +27,18 @@ def load_env():
                     os.environ[key] = value
 
 
+# INT8 scalar quantization keeps a 1-byte-per-dimension copy of each vector in
+# RAM (4x smaller than float32) for the HNSW search; e5 vectors are normalized,
+# so the recall loss is negligible and top hits are rescored with the originals
+QUANTIZATION_CONFIG = ScalarQuantization(
+    scalar=ScalarQuantizationConfig(
+        type=ScalarType.INT8,
+        quantile=0.99,
+        always_ram=True
+    )
+)
+
+
 def setup_collection():
     """Create Qdrant collection and indexes"""
     load_env()
@@ -47,6 +62,12 @@ def setup_collection():
             client.delete_collection(collection_name)
         else:
             print("Keeping existing collection")
+            print("Enabling INT8 scalar quantization on existing collection...")
+            client.update_collection(
+                collection_name=collection_name,
+                quantization_config=QUANTIZATION_CONFIG
+            )
+            print("[OK] Quantization enabled")
             return
     
     # Create collection
@@ -55,8 +76,12 @@ def setup_collection():
         collection_name=collection_name,
         vectors_config=VectorParams(
             size=768,  # e5-base-v2 dimension
-            distance=Distance.COSINE
-        )
+            distance=Distance.COSINE,
+            # Originals are only read to rescore the top candidates, so keep them
+            # memory-mapped and leave the INT8 copy as the only vectors in RAM
+            on_disk=True
+        ),
+        quantization_config=QUANTIZATION_CONFIG
     )
     print("[OK] Collection created")
     
@@ -101,6 +126,7 @@ def setup_collection():
     print(f"  Name: {collection_name}")
     print(f"  Vector size: {collection_info.config.params.vectors.size}")
     print(f"  Distance: {collection_info.config.params.vectors.distance}")
+    print(f"  Quantization: {collection_info.config.quantization_config}")
     print(f"  Points count: {collection_info.points_count}")
 
 
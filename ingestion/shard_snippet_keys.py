@@ -0,0 +1,59 @@
+"""
+Move existing snippets to the hash-sharded key layout
+snippets/<id>.txt -> snippets/ab/cd/<id>.txt, updating resource.snippet_s3_key
+"""
+import argparse
+import logging
+
+from ingestion.s3_uploader import S3Uploader
+from ingestion.update_s3_keys import DatabaseUpdater
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def find_unsharded(db: DatabaseUpdater):
+    """Resources whose snippet still lives directly under snippets/"""
+    with db.conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, snippet_s3_key
+            FROM resource
+            WHERE snippet_s3_key LIKE 'snippets/%%'
+              AND snippet_s3_key NOT LIKE 'snippets/%%/%%'
+        """)
+        return cur.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move snippets to hash-sharded S3 keys")
+    parser.add_argument('--dry-run', action='store_true', help='List moves without making changes')
+    args = parser.parse_args()
+    
+    uploader = S3Uploader()
+    db = DatabaseUpdater()
+    moved = 0
+    
+    try:
+        rows = find_unsharded(db)
+        logger.info(f"Found {len(rows)} snippets to move")
+        
+        for row in rows:
+            old_key = row['snippet_s3_key']
+            new_key = uploader.get_s3_key_for_resource(str(row['id']))
+            
+            if args.dry_run:
+                logger.info(f"[DRY RUN] {old_key} -> {new_key}")
+                continue
+            
+            # Copy, repoint the row, then delete, so readers never see a missing key
+            if uploader.copy_snippet(old_key, new_key) and db.update_resource_s3_key(str(row['id']), new_key):
+                uploader.delete_snippet(old_key)
+                moved += 1
+        
+        logger.info(f"Moved {moved}/{len(rows)} snippets")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,11 @@ class Settings(BaseSettings):
     aws_secret_access_key: str = ""
     aws_region: str = "us-east-1"
     s3_bucket_name: str = "learnpath-snippets"
+    # Per-process urllib3 pool shared by all requests; the service runs one
+    # uvicorn worker, so this bounds concurrent S3 connections per instance
+    s3_max_pool_connections: int = 64
+    # Only the head of each snippet is fetched (ranged GET); 0 = whole object
+    s3_snippet_max_bytes: int = 16384
     
     class Config:
         env_file = ".env.local"
@@ -6,6 +6,8 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from typing import List, Dict, Any, Optional
 from config import get_settings
+from models import QuizAnswer
+from grading import index_questions
 import uuid
 from datetime import datetime
 
@@ -67,6 +69,9 @@ class DatabaseClient:
         """Get resource information from database"""
         try:
             self.ensure_connection()
+            # Plain cursor: a quiz names only a handful of resources, so a named
+            # cursor's DECLARE/FETCH round trips (and the transaction it holds
+            # open) would cost more than buffering the rows
             with self.conn.cursor() as cur:
                 cur.execute("""
                     SELECT id::text as resource_id, title, url, description, snippet_s3_key
@@ -91,10 +96,12 @@ class DatabaseClient:
         try:
             self.ensure_connection()
             with self.conn.cursor() as cur:
-                # Store in original quiz table with items JSONB field
+                # Store in original quiz table with items JSONB field.
+                # by_id pre-indexes the grading fields so submit is O(1) per question
                 quiz_data = {
                     'resource_ids': resource_ids,
-                    'questions': questions
+                    'questions': questions,
+                    'by_id': index_questions(questions)
                 }
                 cur.execute("""
                     INSERT INTO quiz (id, lesson_id, items, created_at)
@@ -122,9 +129,13 @@ class DatabaseClient:
                 result = cur.fetchone()
                 if result:
                     # Extract questions from items JSONB
+                    items = result['items']
+                    questions = items.get('questions', [])
                     return {
                         'quiz_id': str(result['id']),
-                        'questions': result['items'].get('questions', [])
+                        'questions': questions,
+                        # Quizzes saved before by_id existed are indexed on read
+                        'by_id': items.get('by_id') or index_questions(questions)
                     }
                 return None
         except Exception as e:
@@ -136,22 +147,25 @@ class DatabaseClient:
         quiz_id: str,
         user_id: str,
         score: float,
-        answers: List[Dict[str, Any]]
+        answers: List[QuizAnswer]
     ):
         """Save quiz attempt results"""
         try:
+            # Serialize the answers to a JSON array once, in pydantic-core,
+            # rather than dumping to dicts and re-encoding them via Json()
+            answers_json = '[' + ','.join(a.model_dump_json() for a in answers) + ']'
             with self.conn.cursor() as cur:
                 # Store in original quiz_attempt table
                 cur.execute("""
                     INSERT INTO quiz_attempt 
                     (id, quiz_id, user_id, score, answers, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s::jsonb, %s)
                 """, (
                     str(uuid.uuid4()),
                     quiz_id,
                     user_id,
                     score,
-                    psycopg2.extras.Json(answers),
+                    answers_json,
                     datetime.utcnow()
                 ))
                 self.conn.commit()
@@ -0,0 +1,45 @@
+"""
+Quiz grading helpers
+"""
+from typing import List, Dict, Any
+
+from models import QuestionResult
+
+
+def index_questions(questions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Index grading fields by question_id for O(1) lookup
+    
+    Stored as a JSONB object, so key order is not kept; quiz order always
+    comes from the questions array.
+    """
+    return {
+        q.get('question_id'): {
+            'correct_option_id': q.get('correct_option_id'),
+            'explanation': q.get('explanation', ''),
+            'citation': q.get('citation', '')
+        }
+        for q in questions
+    }
+
+
+def grade_answers(
+    questions: List[Dict[str, Any]],
+    by_id: Dict[str, Dict[str, Any]],
+    answer_map: Dict[str, str]
+) -> List[QuestionResult]:
+    """Grade every question in quiz order; unanswered questions count as incorrect"""
+    results = []
+    for question in questions:
+        question_id = question.get('question_id')
+        grading = by_id[question_id]
+        selected_option_id = answer_map.get(question_id, '')
+        results.append(QuestionResult(
+            question_id=question_id,
+            correct=selected_option_id == grading['correct_option_id'],
+            selected_option_id=selected_option_id,
+            correct_option_id=grading['correct_option_id'],
+            explanation=grading['explanation'],
+            citation=grading['citation']
+        ))
+    return results
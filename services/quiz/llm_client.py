@@ -1,12 +1,13 @@
 """
 LLM client for quiz generation using OpenRouter
 """
+import io
 import logging
 import json
 import re
 from typing import List, Dict, Any
 from openai import OpenAI
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
 from config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -14,10 +15,14 @@ logger = logging.getLogger(__name__)
 # --- Pydantic Models for LLM Validation ---
 
 class LLMQuizOption(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     id: str
     text: str
 
 class LLMQuizQuestion(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     question_text: str
     options: List[LLMQuizOption]
     correct_option: str
@@ -26,8 +31,50 @@ class LLMQuizQuestion(BaseModel):
     citation: str
 
 class LLMQuizResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     questions: List[LLMQuizQuestion]
 
+
+# Core schema is compiled once at import; validate_json parses and validates in one pass
+_QUIZ_ADAPTER = TypeAdapter(LLMQuizResponse)
+
+# --- Prompt templates (module-level so the static text is built once) ---
+
+QUIZ_PROMPT_HEADER = """Generate {num} multiple-choice quiz questions based on the following learning resources.
+
+RESOURCES:
+"""
+
+QUIZ_PROMPT_FOOTER = """REQUIREMENTS:
+1. Each question must have 4 options (A, B, C, D)
+2. Only ONE option should be correct
+3. Include a clear explanation for the correct answer
+4. CRITICAL: Include a specific citation (quote or reference) from the source material
+5. Questions should test understanding, not just memorization{difficulty}
+
+Format your response as strictly valid JSON with this exact structure:
+{{
+  "questions": [
+    {{
+      "question_text": "What is...",
+      "options": [
+        {{"id": "A", "text": "Option A"}},
+        {{"id": "B", "text": "Option B"}},
+        {{"id": "C", "text": "Option C"}},
+        {{"id": "D", "text": "Option D"}}
+      ],
+      "correct_option": "A",
+      "explanation": "Explanation of why A is correct",
+      "source_resource_id": "resource_id",
+      "citation": "Specific quote or reference from the resource"
+    }}
+  ]
+}}
+
+Generate exactly {num} questions. Do not wrap the JSON in markdown code blocks.
+"""
+
 # ------------------------------------------
 
 class LLMClient:
@@ -70,17 +117,23 @@ class LLMClient:
             }
         ]
         
-        max_retries = 3
+        # One initial attempt plus one repair attempt. The repair call does not
+        # re-send the snippet prompt: it only carries the system prompt, the
+        # invalid reply and the validation error, so retries are cheap.
+        max_retries = 2
         last_error = None
+        request_messages = messages
+        temperature = 0.7
         
         for attempt in range(max_retries):
+            quiz_text = None
             try:
                 logger.info(f"LLM quiz generation attempt {attempt + 1}/{max_retries}")
                 
                 response = self.client.chat.completions.create(
                     model=self.settings.default_model,
-                    messages=messages,
-                    temperature=0.7,
+                    messages=request_messages,
+                    temperature=temperature,
                     max_tokens=3000,
                 )
                 
@@ -96,10 +149,15 @@ class LLMClient:
                 logger.warning(f"Validation failed on attempt {attempt + 1}: {e}")
                 last_error = e
                 
-                # Add error feedback to messages for next attempt
-                error_message = f"The previous response was invalid. Error: {str(e)}. Please correct the JSON to match the schema exactly."
-                messages.append({"role": "assistant", "content": quiz_text})
-                messages.append({"role": "user", "content": error_message})
+                # Build a repair request from the original system prompt only.
+                # The whole reply is echoed: it carries the citations and resource
+                # ids taken from the snippets, which this call no longer sees
+                request_messages = [
+                    messages[0],
+                    {"role": "assistant", "content": quiz_text or ""},
+                    {"role": "user", "content": f"The JSON was invalid: {e}. Respond with the corrected JSON only."}
+                ]
+                temperature = 0.2
                 
             except Exception as e:
                 logger.error(f"LLM quiz generation error: {e}")
@@ -118,47 +176,18 @@ class LLMClient:
     ) -> str:
         """Build prompt for quiz generation"""
         
-        snippets_text = "\n\n".join([
-            f"[Resource {i+1}: {s['resource_id']}]\nTitle: {s['title']}\nContent:\n{s['content']}"
-            for i, s in enumerate(snippets)
-        ])
-        
         difficulty_instruction = f"\nDifficulty level: {difficulty}" if difficulty else ""
         
-        prompt = f"""Generate {num_questions} multiple-choice quiz questions based on the following learning resources.
-
-RESOURCES:
-{snippets_text}
-
-REQUIREMENTS:
-1. Each question must have 4 options (A, B, C, D)
-2. Only ONE option should be correct
-3. Include a clear explanation for the correct answer
-4. CRITICAL: Include a specific citation (quote or reference) from the source material
-5. Questions should test understanding, not just memorization{difficulty_instruction}
-
-Format your response as strictly valid JSON with this exact structure:
-{{
-  "questions": [
-    {{
-      "question_text": "What is...",
-      "options": [
-        {{"id": "A", "text": "Option A"}},
-        {{"id": "B", "text": "Option B"}},
-        {{"id": "C", "text": "Option C"}},
-        {{"id": "D", "text": "Option D"}}
-      ],
-      "correct_option": "A",
-      "explanation": "Explanation of why A is correct",
-      "source_resource_id": "resource_id",
-      "citation": "Specific quote or reference from the resource"
-    }}
-  ]
-}}
-
-Generate exactly {num_questions} questions. Do not wrap the JSON in markdown code blocks.
-"""
-        return prompt
+        buf = io.StringIO()
+        buf.write(QUIZ_PROMPT_HEADER.format(num=num_questions))
+        for i, s in enumerate(snippets):
+            if i:
+                buf.write("\n\n")
+            buf.write(f"[Resource {i+1}: {s['resource_id']}]\nTitle: {s['title']}\nContent:\n")
+            buf.write(s['content'])
+        buf.write("\n\n")
+        buf.write(QUIZ_PROMPT_FOOTER.format(num=num_questions, difficulty=difficulty_instruction))
+        return buf.getvalue()
     
     def _parse_and_validate_response(self, response_text: str) -> LLMQuizResponse:
         """Parse LLM response into structured quiz questions"""
@@ -174,11 +203,8 @@ Generate exactly {num_questions} questions. Do not wrap the JSON in markdown cod
             json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             json_text = json_match.group(0) if json_match else response_text
         
-        # Parse JSON
-        data = json.loads(json_text)
-        
-        # Validate against Pydantic model
-        return LLMQuizResponse(**data)
+        # Parse and validate against the Pydantic schema
+        return _QUIZ_ADAPTER.validate_json(json_text)
     
     def health_check(self) -> bool:
         """Check if LLM service is available"""
@@ -20,10 +20,11 @@ from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from config import get_settings
 from models import (
     QuizGenerateRequest, QuizResponse, QuizSubmitRequest, QuizSubmitResponse,
-    QuizOption, QuizQuestion, QuestionResult, HealthResponse
+    QuizOption, QuizQuestion, HealthResponse
 )
 from llm_client import get_llm_client
 from database import get_db_client
+from grading import grade_answers
 from s3_client import get_s3_client
 
 # Setup logging
@@ -113,7 +114,8 @@ async def health_check():
         service=settings.service_name,
         database_connected=db_connected,
         llm_available=llm_available,
-        s3_available=s3_available
+        s3_available=s3_available,
+        snippet_cache_hit_ratio=round(s3_client.snippet_cache_hit_ratio, 4)
     )
 
 
@@ -137,12 +139,18 @@ async def generate_quiz(request: QuizGenerateRequest):
                 detail="No resources found with provided IDs"
             )
         
-        # Retrieve snippets from S3
+        # Retrieve snippets from S3 in one concurrent batch
+        snippet_keys = [r['snippet_s3_key'] for r in resources if r.get('snippet_s3_key')]
+        snippets = s3_client.get_snippets(
+            snippet_keys, max_bytes=settings.s3_snippet_max_bytes or None
+        )
+        snippet_contents = dict(zip(snippet_keys, snippets))
+        
         resource_snippets = []
         for resource in resources:
             snippet_key = resource.get('snippet_s3_key')
             if snippet_key:
-                content = s3_client.get_snippet(snippet_key)
+                content = snippet_contents.get(snippet_key)
                 if content:
                     resource_snippets.append({
                         'resource_id': resource['resource_id'],
@@ -255,33 +263,12 @@ async def submit_quiz(request: QuizSubmitRequest):
         if not quiz:
             raise HTTPException(status_code=404, detail="Quiz not found")
         
-        # Grade answers
-        questions = quiz['questions']
-        results = []
-        correct_count = 0
-        
-        # Create answer map
+        # Grade in quiz order; by_id only serves the O(1) lookups
         answer_map = {a.question_id: a.selected_option_id for a in request.answers}
+        results = grade_answers(quiz['questions'], quiz['by_id'], answer_map)
+        correct_count = sum(r.correct for r in results)
         
-        for q in questions:
-            question_id = q.get('question_id')
-            correct_option_id = q.get('correct_option_id')
-            selected_option_id = answer_map.get(question_id, '')
-            
-            is_correct = selected_option_id == correct_option_id
-            if is_correct:
-                correct_count += 1
-            
-            results.append(QuestionResult(
-                question_id=question_id,
-                correct=is_correct,
-                selected_option_id=selected_option_id,
-                correct_option_id=correct_option_id,
-                explanation=q.get('explanation', ''),
-                citation=q.get('citation', '')
-            ))
-        
-        total_questions = len(questions)
+        total_questions = len(results)
         score = (correct_count / total_questions * 100) if total_questions > 0 else 0
         
         # Save attempt
@@ -289,7 +276,7 @@ async def submit_quiz(request: QuizSubmitRequest):
             quiz_id=request.quiz_id,
             user_id="anonymous",  # TODO: Get from auth
             score=score,
-            answers=[a.model_dump() for a in request.answers]
+            answers=request.answers
         )
         
         return QuizSubmitResponse(
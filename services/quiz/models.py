@@ -76,3 +76,4 @@ class HealthResponse(BaseModel):
     database_connected: bool
     llm_available: bool
     s3_available: bool
+    snippet_cache_hit_ratio: float = 0.0
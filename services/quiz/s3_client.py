@@ -1,14 +1,84 @@
 """
 S3 client for retrieving resource snippets
 """
+import io
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from typing import Optional
+from typing import List, Optional, Tuple
 from config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Concurrent GETs issued by get_snippets; the connection pool is sized above
+# this so parallel fetches never wait on (or discard) pooled connections
+SNIPPET_FETCH_WORKERS = 32
+
+# Snippets are immutable once ingested, so cached entries never go stale
+SNIPPET_CACHE_SIZE = 2048
+
+# Body is read in fixed-size chunks rather than one read() of the whole object
+SNIPPET_READ_CHUNK = 64 * 1024
+
+
+class SnippetCache:
+    """Thread-safe bounded LRU of snippet contents keyed on (bucket, key, max_bytes)"""
+    
+    def __init__(self, maxsize: int = SNIPPET_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            content = self._data.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return content
+    
+    def put(self, key: Tuple, content: str):
+        with self._lock:
+            self._data[key] = content
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+_snippet_cache = SnippetCache()
+
+
+def _decode_prefix(data: bytes) -> str:
+    """
+    Decode the first bytes of a UTF-8 object
+    
+    A ranged read can end mid-character, so on failure up to 3 trailing bytes
+    (the longest partial sequence) are dropped; invalid bytes anywhere else
+    still raise.
+    """
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        for k in range(1, 4):
+            try:
+                return data[:-k].decode('utf-8')
+            except UnicodeDecodeError:
+                continue
+        raise
+
 
 class S3Client:
     """Client for S3 operations"""
@@ -16,31 +86,86 @@ class S3Client:
     def __init__(self):
         self.settings = get_settings()
         self.s3 = None
+        self._executor = None
         if self.settings.aws_access_key_id and self.settings.aws_secret_access_key:
             self.s3 = boto3.client(
                 's3',
                 aws_access_key_id=self.settings.aws_access_key_id,
                 aws_secret_access_key=self.settings.aws_secret_access_key,
-                region_name=self.settings.aws_region
+                region_name=self.settings.aws_region,
+                config=Config(
+                    max_pool_connections=self.settings.s3_max_pool_connections,
+                    tcp_keepalive=True,
+                    retries={'max_attempts': 3, 'mode': 'adaptive'}
+                )
             )
     
-    def get_snippet(self, s3_key: str) -> Optional[str]:
-        """Retrieve snippet content from S3"""
+    def get_snippet(self, s3_key: str, max_bytes: Optional[int] = None) -> Optional[str]:
+        """
+        Retrieve snippet content, served from the in-process cache when possible
+        
+        Args:
+            s3_key: Object key of the snippet
+            max_bytes: Only fetch the first max_bytes bytes (ranged GET); None = whole object
+        """
         if not self.s3:
             logger.warning("S3 client not configured")
             return None
         
+        cache_key = (self.settings.s3_bucket_name, s3_key, max_bytes)
+        content = _snippet_cache.get(cache_key)
+        if content is None:
+            content = self._fetch_snippet(s3_key, max_bytes)
+            if content is not None:
+                _snippet_cache.put(cache_key, content)
+        return content
+    
+    @property
+    def snippet_cache_hit_ratio(self) -> float:
+        """Fraction of snippet lookups served from the in-process cache"""
+        return _snippet_cache.hit_ratio
+    
+    def _fetch_snippet(self, s3_key: str, max_bytes: Optional[int] = None) -> Optional[str]:
+        """Retrieve snippet content from S3"""
+        params = {'Bucket': self.settings.s3_bucket_name, 'Key': s3_key}
+        if max_bytes:
+            params['Range'] = f'bytes=0-{max_bytes - 1}'
         try:
-            response = self.s3.get_object(
-                Bucket=self.settings.s3_bucket_name,
-                Key=s3_key
-            )
-            content = response['Body'].read().decode('utf-8')
-            return content
+            response = self.s3.get_object(**params)
+            buf = io.BytesIO()
+            for chunk in response['Body'].iter_chunks(chunk_size=SNIPPET_READ_CHUNK):
+                buf.write(chunk)
+            data = buf.getvalue()
+            return _decode_prefix(data) if max_bytes else data.decode('utf-8')
         except ClientError as e:
+            # A ranged GET of an empty object has no satisfiable range
+            if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 416:
+                return ""
             logger.error(f"Error retrieving snippet from S3: {e}")
             return None
     
+    def get_snippets(self, s3_keys: List[str], max_bytes: Optional[int] = None) -> List[Optional[str]]:
+        """
+        Retrieve several snippets concurrently
+        
+        The boto3 client is thread-safe, so all GETs share its connection pool.
+        Results are returned in the same order as s3_keys.
+        """
+        if not s3_keys:
+            return []
+        if not self.s3:
+            logger.warning("S3 client not configured")
+            return [None] * len(s3_keys)
+        if len(s3_keys) == 1:
+            return [self.get_snippet(s3_keys[0], max_bytes)]
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=SNIPPET_FETCH_WORKERS,
+                thread_name_prefix="s3-snippet"
+            )
+        return list(self._executor.map(lambda key: self.get_snippet(key, max_bytes), s3_keys))
+    
     def health_check(self) -> bool:
         """Check S3 connection"""
         if not self.s3:
@@ -54,6 +179,7 @@ class S3Client:
             return False
 
 
+# Module-level singleton so the connection pool persists across requests
 _s3_client = None
 
 
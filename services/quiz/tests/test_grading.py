@@ -0,0 +1,32 @@
+"""
+Unit tests for quiz grading
+"""
+import json
+
+from grading import grade_answers, index_questions
+
+
+def _questions():
+    return [
+        {"question_id": qid, "correct_option_id": "a", "explanation": f"why {qid}", "citation": f"src {qid}"}
+        for qid in ["q-zeta", "q-alpha", "q-mid"]
+    ]
+
+
+class TestGradeAnswers:
+    """Tests for grade_answers"""
+    
+    def test_results_follow_quiz_order_after_key_reorder(self):
+        """Test that results keep question order when by_id comes back with reordered keys"""
+        questions = _questions()
+        # JSONB does not keep object key order; simulate it with sorted keys
+        by_id = json.loads(json.dumps(index_questions(questions), sort_keys=True))
+        assert list(by_id) != [q["question_id"] for q in questions]
+        
+        results = grade_answers(questions, by_id, {"q-alpha": "a", "q-mid": "b"})
+        
+        assert [r.question_id for r in results] == ["q-zeta", "q-alpha", "q-mid"]
+        assert [r.correct for r in results] == [False, True, False]
+        assert [r.selected_option_id for r in results] == ["", "a", "b"]
+        assert results[1].explanation == "why q-alpha"
+        assert results[1].citation == "src q-alpha"
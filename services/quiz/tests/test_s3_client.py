@@ -0,0 +1,60 @@
+"""
+Unit tests for snippet retrieval in the S3 client
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3_client import S3Client
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self.data = data
+    
+    def iter_chunks(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+
+def _client(data: bytes = b"", error: ClientError = None) -> S3Client:
+    # Bypass __init__, which needs the full service settings
+    client = S3Client.__new__(S3Client)
+    client.settings = MagicMock(s3_bucket_name="snippets")
+    client.s3 = MagicMock()
+    if error is not None:
+        client.s3.get_object.side_effect = error
+    else:
+        client.s3.get_object.return_value = {"Body": FakeBody(data)}
+    return client
+
+
+class TestFetchSnippet:
+    """Tests for S3Client._fetch_snippet"""
+    
+    @pytest.mark.parametrize("cut", [1, 2, 3])
+    def test_ranged_read_drops_partial_trailing_character(self, cut):
+        """Test that a character cut off by the range is dropped"""
+        data = "graph 𝔾".encode("utf-8")
+        client = _client(data[:len(data) - 4 + cut])
+        
+        assert client._fetch_snippet("key", max_bytes=64) == "graph "
+    
+    def test_ranged_read_rejects_invalid_bytes_in_body(self):
+        """Test that invalid bytes before the end are not silently dropped"""
+        client = _client(b"gr\xffaph")
+        
+        with pytest.raises(UnicodeDecodeError):
+            client._fetch_snippet("key", max_bytes=64)
+    
+    def test_ranged_read_of_empty_object_is_empty(self):
+        """Test that a 416 for an empty object yields an empty snippet"""
+        error = ClientError(
+            {"Error": {"Code": "InvalidRange"}, "ResponseMetadata": {"HTTPStatusCode": 416}},
+            "GetObject"
+        )
+        client = _client(error=error)
+        
+        assert client._fetch_snippet("key", max_bytes=64) == ""
+        assert client.s3.get_object.call_args.kwargs["Range"] == "bytes=0-63"
@@ -1,29 +1,65 @@
 """
 Deep Infra API client for embeddings and reranking
 """
+import asyncio
 import httpx
 import logging
-from typing import List, Dict, Any
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional
 
 from config import get_settings
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
 
 
 class DeepInfraClient:
     """HTTP client for Deep Infra API with error handling"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            transport: Optional transport for the sync client; by default
+                requests go to the network
+            async_transport: Optional transport for the async client
+        """
+        settings = get_settings()
         if not settings.deepinfra_api_key:
             raise ValueError("DEEPINFRA_API_KEY is required when USE_DEEPINFRA=true")
         
         self.base_url = settings.deepinfra_base_url
-        self.headers = {
+        # Read-only: the pooled clients take their default headers from this once
+        self.headers = MappingProxyType({
             "Authorization": f"Bearer {settings.deepinfra_api_key}",
             "Content-Type": "application/json"
-        }
+        })
         self.timeout = settings.inference_timeout
+        self.rerank_chunk_size = settings.rerank_chunk_size
+        self.rerank_chunk_workers = settings.rerank_chunk_workers
+        self._executor = None  # Created on the first multi-chunk sync rerank
+        # Request bodies are encoded with orjson (httpx's json= uses stdlib json)
+        self._json_dumps = orjson.dumps
+        # Endpoint URLs are fixed for the lifetime of the client
+        self.embedding_url = f"{self.base_url}/inference/{settings.deepinfra_embedding_model}"
+        self.reranker_url = f"{self.base_url}/inference/{settings.deepinfra_reranker_model}"
+        
+        # Persistent clients so TCP/TLS connections are reused across requests;
+        # HTTP/2 lets concurrent calls multiplex over a single connection.
+        # Idle connections are kept for 5 minutes so bursty traffic skips the
+        # TLS handshake; connect/pool waits fail fast instead of using the full timeout
+        limits = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=300)
+        timeout = httpx.Timeout(self.timeout, connect=5.0, pool=5.0)
+        self._client = httpx.Client(
+            timeout=timeout, headers=self.headers, limits=limits, http2=True, transport=transport
+        )
+        self._aclient = httpx.AsyncClient(
+            timeout=timeout, headers=self.headers, limits=limits, http2=True, transport=async_transport
+        )
         logger.info(f"DeepInfraClient initialized with base_url={self.base_url}")
     
     def generate_embeddings_sync(self, texts: List[str]) -> List[List[float]]:
@@ -36,21 +72,18 @@ class DeepInfraClient:
         Returns:
             List of embedding vectors
         """
-        url = f"{self.base_url}/inference/{settings.deepinfra_embedding_model}"
-        
         try:
-            with httpx.Client(timeout=self.timeout) as client:
-                response = client.post(
-                    url,
-                    headers=self.headers,
-                    json={"inputs": texts}
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                # Deep Infra returns embeddings directly
-                return data["embeddings"]
-                
+            response = self._client.post(
+                self.embedding_url,
+                content=self._json_dumps({"inputs": texts})
+            )
+            response.raise_for_status()
+            # orjson parses large float arrays much faster than stdlib json
+            data = orjson.loads(response.content)
+            
+            # Deep Infra returns embeddings directly
+            return data["embeddings"]
+            
         except httpx.TimeoutException as e:
             logger.error(f"Deep Infra embedding request timed out: {e}")
             raise
@@ -65,37 +98,53 @@ class DeepInfraClient:
         """
         Rerank documents via Deep Infra API (synchronous)
         
+        Large document sets are split into chunks scored concurrently on a
+        thread pool, like the async rerank.
+        
         Args:
             query: Search query
             documents: List of document texts to rerank
         
         Returns:
-            List of relevance scores (one per document)
+            List of relevance scores (one per document, in order)
         """
-        url = f"{self.base_url}/inference/{settings.deepinfra_reranker_model}"
+        size = self.rerank_chunk_size
+        if len(documents) <= size:
+            return self._rerank_chunk_sync(query, documents)
         
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.rerank_chunk_workers, thread_name_prefix="deepinfra-rerank"
+            )
+        # map() yields in submission order, so scores stay aligned with documents
+        chunks = self._executor.map(
+            lambda start: self._rerank_chunk_sync(query, documents[start:start + size]),
+            range(0, len(documents), size)
+        )
+        return [score for chunk in chunks for score in chunk]
+    
+    def _rerank_chunk_sync(self, query: str, documents: List[str]) -> List[float]:
+        """Score one chunk of documents (synchronous)"""
         # Qwen reranker API expects: {"queries": [...], "documents": [...]}
-        # For single query, we send the same query for all documents
+        # A single-element queries list scores every document against that query
         try:
-            with httpx.Client(timeout=self.timeout) as client:
-                response = client.post(
-                    url,
-                    headers=self.headers,
-                    json={
-                        "queries": [query],
-                        "documents": documents
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = self._client.post(
+                self.reranker_url,
+                content=self._json_dumps({
+                    "queries": [query],
+                    "documents": documents
+                })
+            )
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            
+            # Qwen reranker returns {"scores": [...]}
+            if "scores" in data:
+                return [float(s) for s in data["scores"]]
+            else:
+                logger.warning(f"Unexpected rerank response format: {data}")
+                return [0.0] * len(documents)
                 
-                # Qwen reranker returns {"scores": [...]}
-                if "scores" in data:
-                    return [float(s) for s in data["scores"]]
-                else:
-                    logger.warning(f"Unexpected rerank response format: {data}")
-                    return [0.0] * len(documents)
-                    
         except httpx.TimeoutException as e:
             logger.error(f"Deep Infra rerank request timed out: {e}")
             raise
@@ -108,36 +157,56 @@ class DeepInfraClient:
     
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Async version for future use"""
-        url = f"{self.base_url}/inference/{settings.deepinfra_embedding_model}"
-        
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                url,
-                headers=self.headers,
-                json={"inputs": texts}
-            )
-            response.raise_for_status()
-            return response.json()["embeddings"]
+        response = await self._aclient.post(
+            self.embedding_url,
+            content=self._json_dumps({"inputs": texts})
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content)["embeddings"]
     
     async def rerank(self, query: str, documents: List[str]) -> List[float]:
-        """Async version for future use"""
-        url = f"{self.base_url}/inference/{settings.deepinfra_reranker_model}"
+        """
+        Async rerank; large document sets are split into chunks scored concurrently
         
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                url,
-                headers=self.headers,
-                json={
-                    "queries": [query],
-                    "documents": documents
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if "scores" in data:
-                return [float(s) for s in data["scores"]]
-            return [0.0] * len(documents)
+        Scores are returned in the order of documents.
+        """
+        size = self.rerank_chunk_size
+        if len(documents) <= size:
+            return await self._rerank_chunk(query, documents)
+        
+        chunks = await asyncio.gather(*(
+            self._rerank_chunk(query, documents[i:i + size])
+            for i in range(0, len(documents), size)
+        ))
+        return [score for chunk in chunks for score in chunk]
+    
+    async def _rerank_chunk(self, query: str, documents: List[str]) -> List[float]:
+        """Score one chunk of documents"""
+        response = await self._aclient.post(
+            self.reranker_url,
+            content=self._json_dumps({
+                "queries": [query],
+                "documents": documents
+            })
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        
+        if "scores" in data:
+            return [float(s) for s in data["scores"]]
+        return [0.0] * len(documents)
+    
+    def close(self):
+        """Close the sync client's pooled connections and the rerank chunk executor"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._client.close()
+    
+    async def aclose(self):
+        """Close the pooled HTTP connections (sync and async) and the executor"""
+        self.close()
+        await self._aclient.aclose()
 
 
 # Singleton instance
@@ -150,3 +219,11 @@ def get_deepinfra_client() -> DeepInfraClient:
     if _client is None:
         _client = DeepInfraClient()
     return _client
+
+
+async def close_deepinfra_client():
+    """Close the Deep Infra client if it was created (called on shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,107 +1,238 @@
 """
 Embedding generation with Deep Infra API or local fallback
 """
+import asyncio
 import logging
-from typing import List
+from typing import List, Optional, Protocol, Tuple
 
-from config import get_settings
+import numpy as np
+
+from batching import AsyncBatcher
+from caching import LRUCache
+from config import Settings, get_settings
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
+
+# e5 instruction prefixes, built once; any other instruction embeds as a passage
+_INSTR_PREFIX = {"query": "query: ", "passage": "passage: "}
+_PASSAGE_PREFIX = _INSTR_PREFIX["passage"]
+
+
+class EmbeddingBackend(Protocol):
+    """Turns already-prefixed texts into a float32 (len(texts), dimension) array"""
+    
+    def encode(self, texts: List[str]) -> np.ndarray: ...
+    
+    async def aencode(self, texts: List[str]) -> np.ndarray: ...
+
+
+class DeepInfraBackend:
+    """Embeddings via the Deep Infra inference API"""
+    
+    def __init__(self, settings: Settings, batch_size: Optional[int] = None):
+        self.settings = settings
+        self._client = None
+        self._batcher = None  # Created on first async call
+        self._batch_size = batch_size or settings.embedding_api_batch_size
+    
+    def _get_client(self):
+        """Lazy load Deep Infra client"""
+        if self._client is None:
+            from deepinfra_client import get_deepinfra_client
+            self._client = get_deepinfra_client()
+        return self._client
+    
+    def _get_batcher(self) -> AsyncBatcher:
+        """Lazy create the micro-batcher that coalesces concurrent API calls"""
+        if self._batcher is None:
+            self._batcher = AsyncBatcher(
+                self._get_client().generate_embeddings,
+                max_batch=self.settings.embedding_batch_max_size,
+                max_wait_ms=self.settings.embedding_batch_wait_ms,
+                timeout=self.settings.inference_timeout
+            )
+        return self._batcher
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        # Large inputs are sent as several requests so none exceeds the API limits
+        client = self._get_client()
+        size = self._batch_size
+        vectors = []
+        for start in range(0, len(texts), size):
+            vectors.extend(client.generate_embeddings_sync(texts[start:start + size]))
+        return np.asarray(vectors, dtype=np.float32)
+    
+    async def aencode(self, texts: List[str]) -> np.ndarray:
+        # Each text goes through the shared batcher, so texts from concurrent
+        # requests are sent in one API call
+        batcher = self._get_batcher()
+        vectors = await asyncio.gather(*map(batcher.submit, texts))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class LocalBackend:
+    """Embeddings from a local SentenceTransformer or ONNX Runtime model"""
+    
+    def __init__(self, settings: Settings, batch_size: Optional[int] = None):
+        self.settings = settings
+        self._model = None  # Lazy loaded on first use
+        self._configured_batch_size = batch_size or settings.encode_batch_size
+        self._batch_size = self._configured_batch_size or 32
+    
+    def load(self):
+        """Load the local model (ONNX Runtime or PyTorch)"""
+        if self._model is not None:
+            return self._model
+        
+        quantize = self.settings.use_quantization and self.settings.quantization_config != "none"
+        
+        if self.settings.use_onnx:
+            from onnx_models import OnnxEmbeddingModel
+            
+            logger.info(f"Loading local embedding model with ONNX Runtime: {self.settings.embedding_model}")
+            self._model = OnnxEmbeddingModel(
+                self.settings.embedding_model,
+                cache_dir=self.settings.onnx_cache_dir,
+                quantize=quantize,
+                max_seq_length=self.settings.onnx_max_seq_length
+            )
+            logger.info("✓ Local embedding model ready")
+            return self._model
+        
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        logger.info(f"Loading local embedding model: {self.settings.embedding_model} on {device}")
+        
+        # Larger batches keep a GPU busy; CPU throughput flattens out around 32
+        self._batch_size = self._configured_batch_size or (128 if device == "cuda" else 32)
+        
+        model = SentenceTransformer(self.settings.embedding_model, device=device)
+        
+        # Apply quantization if enabled
+        if quantize:
+            if device == "cpu":
+                model[0].auto_model = torch.quantization.quantize_dynamic(
+                    model[0].auto_model,
+                    {torch.nn.Linear},
+                    dtype=torch.qint8
+                )
+                logger.info("✓ Applied INT8 quantization")
+            else:
+                if hasattr(model, 'half'):
+                    model = model.half()
+                    logger.info("✓ Using FP16 precision")
+        
+        self._model = model
+        logger.info("✓ Local embedding model ready")
+        return self._model
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        model = self.load()
+        embeddings = model.encode(
+            texts,
+            batch_size=self._batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+        return embeddings.astype(np.float32, copy=False)
+    
+    async def aencode(self, texts: List[str]) -> np.ndarray:
+        # Run the model in a worker thread to keep the event loop free
+        return await asyncio.to_thread(self.encode, texts)
 
 
 class EmbeddingService:
-    """Service for generating embeddings via API or local model"""
+    """
+    Service for generating embeddings via API or local model
+    
+    batch_size overrides the configured texts per API request / model batch
+    (embedding_api_batch_size or encode_batch_size).
+    """
     
-    def __init__(self):
-        self.use_deepinfra = settings.use_deepinfra
-        self._local_model = None  # Lazy loaded only if needed
-        self._deepinfra_client = None
+    def __init__(self, batch_size: Optional[int] = None):
+        self.settings = get_settings()
+        self.use_deepinfra = self.settings.use_deepinfra
         
+        self.backend: EmbeddingBackend
         if self.use_deepinfra:
+            self.backend = DeepInfraBackend(self.settings, batch_size)
             logger.info("EmbeddingService initialized with Deep Infra API")
         else:
+            self.backend = LocalBackend(self.settings, batch_size)
             logger.info("EmbeddingService initialized with local PyTorch model")
-    
-    def _get_deepinfra_client(self):
-        """Lazy load Deep Infra client"""
-        if self._deepinfra_client is None:
-            from deepinfra_client import get_deepinfra_client
-            self._deepinfra_client = get_deepinfra_client()
-        return self._deepinfra_client
-    
-    def _load_local_model(self):
-        """Load local PyTorch model (fallback)"""
-        if self._local_model is None:
-            import torch
-            from sentence_transformers import SentenceTransformer
-            
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            logger.info(f"Loading local embedding model: {settings.embedding_model} on {device}")
-            
-            self._local_model = SentenceTransformer(settings.embedding_model, device=device)
-            
-            # Apply quantization if enabled
-            if settings.use_quantization and settings.quantization_config != "none":
-                if device == "cpu":
-                    self._local_model[0].auto_model = torch.quantization.quantize_dynamic(
-                        self._local_model[0].auto_model,
-                        {torch.nn.Linear},
-                        dtype=torch.qint8
-                    )
-                    logger.info("✓ Applied INT8 quantization")
-                else:
-                    if hasattr(self._local_model, 'half'):
-                        self._local_model = self._local_model.half()
-                        logger.info("✓ Using FP16 precision")
-            
-            logger.info("✓ Local embedding model ready")
         
-        return self._local_model
+        # Repeated queries are common on /search; e5 is uncased, so keys are normalized
+        self._single_cache = LRUCache(self.settings.query_embedding_cache_size)
+    
+    @staticmethod
+    def _prefix(texts: List[str], instruction: str) -> List[str]:
+        """Add the e5 instruction prefix ('query' or 'passage')"""
+        prefix = _INSTR_PREFIX.get(instruction, _PASSAGE_PREFIX)
+        return list(map(prefix.__add__, texts))
     
     def generate_embeddings(
         self,
         texts: List[str],
-        instruction: str = "passage"
-    ) -> List[List[float]]:
+        instruction: str = "passage",
+        already_prefixed: bool = False
+    ) -> np.ndarray:
         """
         Generate embeddings for a list of texts
         
         Args:
             texts: List of texts to embed
             instruction: Instruction prefix ('query' or 'passage')
+            already_prefixed: Texts already carry their e5 prefix; skip adding it
         
         Returns:
-            List of embedding vectors
+            float32 array of shape (len(texts), dimension)
         """
-        # Add instruction prefix for e5 models
-        prefix = "query: " if instruction == "query" else "passage: "
-        prefixed_texts = [f"{prefix}{text}" for text in texts]
-        
-        if self.use_deepinfra:
-            return self._generate_via_api(prefixed_texts)
-        else:
-            return self._generate_local(prefixed_texts)
+        if not already_prefixed:
+            texts = self._prefix(texts, instruction)
+        return self.backend.encode(texts)
     
-    def _generate_via_api(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings via Deep Infra API"""
-        client = self._get_deepinfra_client()
-        return client.generate_embeddings_sync(texts)
+    def clear_cache(self):
+        """Drop cached single-text embeddings"""
+        self._single_cache.clear()
     
-    def _generate_local(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using local model"""
-        model = self._load_local_model()
-        embeddings = model.encode(
-            texts,
-            batch_size=16,
-            show_progress_bar=False,
-            convert_to_numpy=True
-        )
-        return embeddings.tolist()
+    @staticmethod
+    def _single_key(text: str, instruction: str) -> Tuple[str, str]:
+        # Whitespace runs are collapsed, but case is kept: the configured model may be cased
+        return instruction, " ".join(text.split())
+    
+    def _cache_single(self, key: Tuple[str, str], vector: np.ndarray) -> np.ndarray:
+        # Cached vectors are shared between callers, so freeze them
+        vector.setflags(write=False)
+        self._single_cache.put(key, vector)
+        return vector
+    
+    def generate_single_embedding(self, text: str, instruction: str = "passage") -> np.ndarray:
+        """Generate embedding for a single text (cached)"""
+        key = self._single_key(text, instruction)
+        vector = self._single_cache.get(key)
+        if vector is None:
+            prefix = _INSTR_PREFIX.get(instruction, _PASSAGE_PREFIX)
+            vector = self._cache_single(key, self.backend.encode([prefix + text])[0])
+        return vector
+    
+    async def agenerate_embeddings(
+        self,
+        texts: List[str],
+        instruction: str = "passage"
+    ) -> np.ndarray:
+        """Async version of generate_embeddings"""
+        return await self.backend.aencode(self._prefix(texts, instruction))
     
-    def generate_single_embedding(self, text: str, instruction: str = "passage") -> List[float]:
-        """Generate embedding for a single text"""
-        return self.generate_embeddings([text], instruction)[0]
+    async def agenerate_single_embedding(self, text: str, instruction: str = "passage") -> np.ndarray:
+        """Async version of generate_single_embedding"""
+        key = self._single_key(text, instruction)
+        vector = self._single_cache.get(key)
+        if vector is None:
+            prefix = _INSTR_PREFIX.get(instruction, _PASSAGE_PREFIX)
+            vector = self._cache_single(key, (await self.backend.aencode([prefix + text]))[0])
+        return vector
 
 
 # Global instance
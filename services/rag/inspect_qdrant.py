@@ -1,6 +1,12 @@
+import argparse
+import asyncio
 import logging
-from qdrant_client import QdrantClient
+import sys
+from typing import AsyncIterator, Iterator, List, Optional
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from config import get_settings
+from qdrant_connection import get_qdrant_client
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -8,37 +14,126 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
-def inspect_qdrant():
-    client = QdrantClient(
-        url=settings.qdrant_url,
-        api_key=settings.qdrant_api_key,
-    )
-    
+SCROLL_PAGE_SIZE = 256
+DEFAULT_FIELDS = ["title", "url", "tenant_id"]
+
+
+def iter_points(
+    client: QdrantClient,
+    fields: List[str],
+    limit: Optional[int] = None,
+    page_size: int = SCROLL_PAGE_SIZE
+) -> Iterator:
+    """Yield points page by page, fetching only the requested payload keys"""
+    offset = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch = page_size if remaining is None else min(page_size, remaining)
+        points, offset = client.scroll(
+            collection_name=settings.qdrant_collection,
+            limit=batch,
+            offset=offset,
+            with_payload=fields,
+            with_vectors=False
+        )
+        yield from points
+        if remaining is not None:
+            remaining -= len(points)
+        if offset is None:
+            break
+
+
+async def aiter_points(
+    client: AsyncQdrantClient,
+    fields: List[str],
+    limit: Optional[int] = None,
+    page_size: int = SCROLL_PAGE_SIZE
+) -> AsyncIterator:
+    """Async twin of iter_points for use alongside other concurrent scrolls"""
+    offset = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch = page_size if remaining is None else min(page_size, remaining)
+        points, offset = await client.scroll(
+            collection_name=settings.qdrant_collection,
+            limit=batch,
+            offset=offset,
+            with_payload=fields,
+            with_vectors=False
+        )
+        for point in points:
+            yield point
+        if remaining is not None:
+            remaining -= len(points)
+        if offset is None:
+            break
+
+
+def _write_point(out, point):
+    out.write(f"ID: {point.id}\n")
+    out.write(f"Payload: {point.payload}\n")
+    out.write("-" * 20 + "\n")
+
+
+def _print_collection_info(info):
+    print(f"Collection '{settings.qdrant_collection}' status: {info.status}")
+    print(f"Points count: {info.points_count}")
+    print(f"Quantization: {info.config.quantization_config or 'none'}")
+
+
+def inspect_qdrant(limit: Optional[int] = 5, fields: List[str] = DEFAULT_FIELDS):
+    client = get_qdrant_client()
+
     print(f"Connecting to Qdrant at {settings.qdrant_url}...")
-    
+
     # Get collection info
     try:
-        info = client.get_collection(settings.qdrant_collection)
-        print(f"Collection '{settings.qdrant_collection}' status: {info.status}")
-        print(f"Points count: {info.points_count}")
+        _print_collection_info(client.get_collection(settings.qdrant_collection))
     except Exception as e:
         print(f"Error getting collection info: {e}")
         return
 
     # Scroll points
     print("\n--- Sample Points ---")
-    response = client.scroll(
-        collection_name=settings.qdrant_collection,
-        limit=5,
-        with_payload=True,
-        with_vectors=False
+    out = sys.stdout  # buffered; flushed once at the end
+    for point in iter_points(client, fields, limit):
+        _write_point(out, point)
+    out.flush()
+
+
+async def ainspect_qdrant(limit: Optional[int] = 5, fields: List[str] = DEFAULT_FIELDS):
+    client = AsyncQdrantClient(
+        url=settings.qdrant_url,
+        api_key=settings.qdrant_api_key,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+        grpc_port=settings.qdrant_grpc_port,
     )
-    
-    points = response[0]
-    for point in points:
-        print(f"ID: {point.id}")
-        print(f"Payload: {point.payload}")
-        print("-" * 20)
+
+    print(f"Connecting to Qdrant at {settings.qdrant_url}...")
+
+    try:
+        _print_collection_info(await client.get_collection(settings.qdrant_collection))
+    except Exception as e:
+        print(f"Error getting collection info: {e}")
+        return
+
+    print("\n--- Sample Points ---")
+    out = sys.stdout  # buffered; flushed once at the end
+    async for point in aiter_points(client, fields, limit):
+        _write_point(out, point)
+    out.flush()
+
 
 if __name__ == "__main__":
-    inspect_qdrant()
+    parser = argparse.ArgumentParser(description="Inspect the Qdrant resources collection")
+    parser.add_argument("--limit", type=int, default=5, help="Points to print (0 = all)")
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS), help="Comma-separated payload keys to fetch")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use AsyncQdrantClient")
+    args = parser.parse_args()
+
+    limit = args.limit or None
+    fields = [f for f in args.fields.split(",") if f]
+    if args.use_async:
+        asyncio.run(ainspect_qdrant(limit, fields))
+    else:
+        inspect_qdrant(limit, fields)
@@ -3,18 +3,32 @@ RAG (Retrieval-Augmented Generation) Service
 Handles semantic search over learning resources using Qdrant
 Also provides ingestion endpoints for skills and resources
 """
+import asyncio
+import hashlib
+import io
 import logging
 import os
+import threading
+import time
 import uuid
 import boto3
-import requests
+import httpx
+import orjson
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from bs4 import BeautifulSoup
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import asynccontextmanager
-from typing import List, Optional, Dict, Any
+from email.utils import formatdate
+from urllib.parse import urlsplit
+from typing import List, Optional, Dict, Any, Tuple
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
@@ -28,6 +42,9 @@ from models import (
 from embeddings import get_embedding_service
 from search import get_search_service
 from rerank import get_rerank_service
+from deepinfra_client import close_deepinfra_client
+from qdrant_connection import warm_qdrant_client
+from caching import LRUCache
 
 # OpenTelemetry Imports
 from opentelemetry import trace
@@ -47,6 +64,26 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+async def warm_up_models():
+    """Load models and run one pass so the first real request doesn't pay for it"""
+    try:
+        # On the API path this opens the pooled HTTP/2 connection to Deep Infra
+        await app.state.embedding_service.agenerate_embeddings(["warmup"], instruction="query")
+        if not settings.use_deepinfra:
+            await app.state.rerank_service.arerank("warmup", [{"title": "warmup"}], top_n=1)
+        logger.info("✓ Models warmed up")
+    except Exception as e:
+        logger.warning(f"Model warm-up failed: {e}")
+
+
+async def preload_reranker():
+    """Load the local reranker model ahead of the first rerank"""
+    try:
+        await asyncio.to_thread(app.state.rerank_service.load)
+    except Exception as e:
+        logger.warning(f"Reranker preload failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
@@ -54,15 +91,52 @@ async def lifespan(app: FastAPI):
     logger.info(f"Starting {settings.service_name} on port {settings.port}")
     logger.info(f"Environment: {settings.environment}")
     
-    # NOTE: Models and Qdrant connection are loaded lazily on first request
-    # This ensures fast startup for Cloud Run health checks
-    logger.info("Service will load models and connect to Qdrant on first request")
+    # Service objects are cheap to build (models still load lazily), so create
+    # them once here; handlers read them from app.state instead of the getters
+    app.state.embedding_service = get_embedding_service()
+    app.state.search_service = get_search_service()
+    app.state.rerank_service = get_rerank_service()
+    
+    # Shared client for fetching resource pages during ingestion
+    app.state.http = create_http_client()
+    
+    # Open the database pool now; if Postgres isn't reachable yet it is
+    # created on first use instead
+    try:
+        await asyncio.to_thread(get_db_pool)
+    except Exception as e:
+        logger.warning(f"Database pool not created at startup: {e}")
+    
+    # Opening the Qdrant connection is cheap, so do it before traffic arrives
+    if await asyncio.to_thread(warm_qdrant_client):
+        logger.info("✓ Qdrant connection warmed")
+    app.state.search_service.connect()
+    
+    # NOTE: Models are warmed in the background so startup (and Cloud Run
+    # health checks) never waits on a model download or CUDA init
+    background_tasks = []
+    if not settings.use_deepinfra:
+        # The local reranker is the slowest model to load; start it right away
+        # so the first rerank doesn't pay for it (requests arriving earlier wait
+        # for this load rather than starting another)
+        background_tasks.append(asyncio.create_task(preload_reranker()))
+    if settings.warmup_models:
+        logger.info("Warming up models in the background")
+        background_tasks.append(asyncio.create_task(warm_up_models()))
+    else:
+        logger.info("Service will load remaining models on first request")
     logger.info("Service ready")
     
     yield
     
     # Shutdown
     logger.info("Shutting down service")
+    for task in background_tasks:
+        if not task.done():
+            task.cancel()
+    await app.state.http.aclose()
+    close_db_pool()
+    await close_deepinfra_client()
 
 
 # Create FastAPI app
@@ -70,7 +144,8 @@ app = FastAPI(
     title="RAG Service",
     description="Retrieval-Augmented Generation service for Learning Path Designer",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Setup OpenTelemetry
@@ -108,20 +183,20 @@ async def health_check():
     """Health check endpoint"""
     logger.info("Health check called")
     
-    # Check if services are initialized (lazy loading)
+    # Check if services are initialized (created in lifespan)
     models_loaded = False
     qdrant_connected = False
     
     try:
         # Try to get embedding service to check if models are loaded
-        embedding_service = get_embedding_service()
+        embedding_service = app.state.embedding_service
         models_loaded = embedding_service is not None
     except Exception:
         pass
     
     try:
         # Try to get search service to check Qdrant connection
-        search_service = get_search_service()
+        search_service = app.state.search_service
         qdrant_connected = search_service is not None
     except Exception:
         pass
@@ -140,16 +215,21 @@ async def generate_embeddings(request: EmbedRequest):
     Generate embeddings for a list of texts
     """
     try:
-        embedding_service = get_embedding_service()
-        embeddings = embedding_service.generate_embeddings(
+        embedding_service = app.state.embedding_service
+        embeddings = await embedding_service.agenerate_embeddings(
             request.texts,
             instruction=request.instruction
         )
         
-        return EmbedResponse(
-            embeddings=embeddings,
-            dimension=settings.embedding_dimension,
-            model=settings.embedding_model
+        # Serialize the float32 array directly; going through EmbedResponse
+        # would validate every float in Python (the schema is still documented)
+        return ORJSONResponse(
+            {
+                "embeddings": embeddings,
+                "dimension": settings.embedding_dimension,
+                "model": settings.embedding_model
+            },
+            option=orjson.OPT_SERIALIZE_NUMPY
         )
     
     except Exception as e:
@@ -165,7 +245,7 @@ async def search_resources(request: SearchRequest):
     try:
         # 1. Retrieve Candidates
         top_k = request.top_k or settings.top_k
-        candidates = retrieve_candidates(
+        candidates = await retrieve_candidates(
             query=request.query,
             filters=request.filters,
             top_k=top_k,
@@ -175,7 +255,7 @@ async def search_resources(request: SearchRequest):
         # 2. Rerank Candidates (if requested and candidates found)
         if request.rerank and len(candidates) > 0:
             rerank_top_n = request.rerank_top_n or settings.rerank_k
-            results = rerank_candidates(
+            results = await rerank_candidates(
                 query=request.query,
                 documents=candidates,
                 top_n=min(rerank_top_n, len(candidates))
@@ -202,7 +282,7 @@ async def search_resources(request: SearchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def retrieve_candidates(
+async def retrieve_candidates(
     query: str,
     filters: Optional[BaseModel] = None,
     top_k: int = 20,
@@ -211,7 +291,7 @@ def retrieve_candidates(
     """
     Retrieve candidate resources using semantic search
     """
-    search_service = get_search_service()
+    search_service = app.state.search_service
     
     # Convert filters to dict if present, excluding None values to allow defaults/injection
     filters_dict = filters.model_dump(exclude_none=True) if filters else {}
@@ -220,14 +300,14 @@ def retrieve_candidates(
     if tenant_id and "tenant_id" not in filters_dict:
         filters_dict["tenant_id"] = tenant_id
     
-    return search_service.search(
+    return await search_service.asearch(
         query=query,
         filters=filters_dict,
         top_k=top_k
     )
 
 
-def rerank_candidates(
+async def rerank_candidates(
     query: str,
     documents: List[Dict[str, Any]],
     top_n: int = 5
@@ -235,9 +315,9 @@ def rerank_candidates(
     """
     Rerank candidate resources using cross-encoder
     """
-    rerank_service = get_rerank_service()
+    rerank_service = app.state.rerank_service
     
-    reranked_results, scores = rerank_service.rerank(
+    reranked_results, scores = await rerank_service.arerank(
         query=query,
         documents=documents,
         top_n=top_n
@@ -256,9 +336,9 @@ async def rerank_documents(request: RerankRequest):
     Rerank a list of documents based on relevance to query
     """
     try:
-        rerank_service = get_rerank_service()
+        rerank_service = app.state.rerank_service
         
-        reranked_docs, scores = rerank_service.rerank(
+        reranked_docs, scores = await rerank_service.arerank(
             query=request.query,
             documents=request.documents,
             top_n=request.top_n
@@ -274,6 +354,17 @@ async def rerank_documents(request: RerankRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/cache/clear")
+async def clear_caches():
+    """Drop the in-process extraction, query-embedding, search and rerank caches"""
+    _extract_cache.clear()
+    app.state.embedding_service.clear_cache()
+    app.state.search_service.clear_cache()
+    app.state.rerank_service.clear_cache()
+    logger.info("✓ Caches cleared")
+    return {"status": "cleared"}
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -295,6 +386,7 @@ class Skill(BaseModel):
     level_hint: int = Field(0, ge=0, le=2)
     description: Optional[str] = None
     prerequisites: List[str] = Field(default_factory=list)
+    tenant_id: str = Field(default="global", description="Tenant ID for this skill")
 
 
 class Resource(BaseModel):
@@ -327,95 +419,316 @@ class IngestResponse(BaseModel):
     errors: List[str] = Field(default_factory=list)
 
 
+# Pooled Postgres connections shared by the ingestion endpoints
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> ThreadedConnectionPool:
+    """Get or create the connection pool"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ThreadedConnectionPool(
+                minconn=settings.db_pool_min_size,
+                maxconn=settings.db_pool_max_size,
+                dsn=settings.database_url,
+                cursor_factory=RealDictCursor
+            )
+            logger.info("✓ Database connection pool created")
+    return _db_pool
+
+
+def close_db_pool():
+    """Close every pooled connection (called on shutdown)"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.closeall()
+            _db_pool = None
+
+
 def get_db_connection():
-    """Get database connection"""
-    return psycopg2.connect(settings.database_url, cursor_factory=RealDictCursor)
+    """Get database connection from the pool; hand it back with release_db_connection"""
+    return get_db_pool().getconn()
 
 
-def extract_content_from_url(url: str, max_length: int = 3000) -> Dict[str, Any]:
-    """
-    Extract text content and metadata from a URL.
-    Returns a dict with keys: content, title, description, estimated_duration_min.
-    """
-    result = {
+def release_db_connection(conn):
+    """Return a connection to the pool"""
+    get_db_pool().putconn(conn)
+
+
+_EXTRACT_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Pooled async client for content extraction so connections are kept alive between fetches"""
+    return httpx.AsyncClient(
+        timeout=10,
+        follow_redirects=True,
+        headers=_EXTRACT_HEADERS,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        transport=httpx.AsyncHTTPTransport(retries=2)
+    )
+
+
+# lxml builds the same tree as html.parser for extraction purposes, several
+# times faster; the whole document is parsed so chrome can be removed by tag
+_HTML_PARSER = 'lxml'
+_UNWANTED_TAGS = ('script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe')
+
+
+# Bytes of each page downloaded for extraction; the rest is never read
+EXTRACT_MAX_BYTES = int(os.getenv('EXTRACT_MAX_BYTES', 1024 * 1024))
+
+# Successful extractions, keyed by (url, max_length); pages can change, so entries expire
+_extract_cache = LRUCache(maxsize=2048, ttl=3600)
+
+# Extractions are also kept in S3 so re-ingesting a URL (or ingesting it from
+# another instance) skips the fetch and parse; 0 disables the S3 cache
+EXTRACT_S3_CACHE_TTL = int(os.getenv('EXTRACT_S3_CACHE_TTL', 7 * 24 * 3600))
+
+
+def extraction_s3_key(url: str) -> str:
+    """S3 key of the cached extraction for a URL"""
+    return f"snippets-by-url/{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+
+def load_stored_extraction(url: str, max_length: int) -> Optional[Tuple[Dict[str, Any], float]]:
+    """Return (extraction, stored-at timestamp) from S3, or None if there is none"""
+    try:
+        obj = get_s3_client().get_object(
+            Bucket=os.getenv('S3_BUCKET_NAME', 'learnpath-snippets'),
+            Key=extraction_s3_key(url)
+        )
+        record = orjson.loads(obj['Body'].read())
+    except get_s3_client().exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to read cached extraction for {url}: {e}")
+        return None
+    
+    if record.get("max_length") != max_length:
+        return None
+    return record["result"], obj['LastModified'].timestamp()
+
+
+def store_extraction(url: str, max_length: int, result: Dict[str, Any]):
+    """Write an extraction to the S3 cache (best effort)"""
+    try:
+        get_s3_client().put_object(
+            Bucket=os.getenv('S3_BUCKET_NAME', 'learnpath-snippets'),
+            Key=extraction_s3_key(url),
+            Body=orjson.dumps({"url": url, "max_length": max_length, "result": result}),
+            ContentType='application/json'
+        )
+    except Exception as e:
+        logger.warning(f"Failed to cache extraction for {url}: {e}")
+
+
+def _empty_extraction() -> Dict[str, Any]:
+    return {
         "content": None,
         "title": None,
         "description": None,
         "estimated_duration_min": 5 # Default fallback
     }
+
+
+def parse_page(html: bytes, max_length: int = 3000) -> Dict[str, Any]:
+    """
+    Extract text content and metadata from a fetched HTML page.
+    Returns a dict with keys: content, title, description, estimated_duration_min.
+    """
+    result = _empty_extraction()
+    soup = BeautifulSoup(html, _HTML_PARSER)
     
-    try:
-        response = requests.get(url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
+    # Extract title
+    if soup.title and soup.title.string:
+        result["title"] = soup.title.string.strip()
         
-        # Extract title
-        if soup.title and soup.title.string:
-            result["title"] = soup.title.string.strip()
-            
-        # Extract description
-        meta_desc = soup.find("meta", attrs={"name": "description"}) or soup.find("meta", attrs={"property": "og:description"})
-        if meta_desc:
-            content = meta_desc.get("content")
-            if content:
-                result["description"] = content.strip()
-        
-        # Remove unwanted elements for content extraction
-        for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe']):
-            element.decompose()
-        
-        # Try to find main content
-        content_text = None
-        for tag in [soup.find('article'), soup.find('main'), soup.find('div', class_='content')]:
-            if tag:
-                content_text = tag.get_text()
-                break
-        
-        if not content_text:
-            content_text = soup.get_text()
-        
-        # Clean and truncate
-        lines = [line.strip() for line in content_text.splitlines() if line.strip()]
-        text = ' '.join(lines)
-        
-        # Calculate estimated duration (avg 200 wpm)
-        word_count = len(text.split())
-        result["estimated_duration_min"] = max(1, round(word_count / 200))
-        
-        if len(text) > max_length:
-            text = text[:max_length]
+    # Extract description
+    meta_desc = soup.find("meta", attrs={"name": "description"}) or soup.find("meta", attrs={"property": "og:description"})
+    if meta_desc:
+        content = meta_desc.get("content")
+        if content:
+            result["description"] = content.strip()
+    
+    # Remove unwanted elements for content extraction
+    for element in soup(_UNWANTED_TAGS):
+        element.decompose()
+    
+    # Try to find main content
+    content_text = None
+    for tag in [soup.find('article'), soup.find('main'), soup.find('div', class_='content')]:
+        if tag:
+            content_text = tag.get_text()
+            break
+    
+    if not content_text:
+        content_text = soup.get_text()
+    
+    # Clean and truncate
+    lines = [line.strip() for line in content_text.splitlines() if line.strip()]
+    text = ' '.join(lines)
+    
+    # Calculate estimated duration (avg 200 wpm)
+    word_count = len(text.split())
+    result["estimated_duration_min"] = max(1, round(word_count / 200))
+    
+    if len(text) > max_length:
+        text = text[:max_length]
+    
+    result["content"] = text if len(text) > 100 else None
+    
+    return result
+
+
+async def extract_content_from_url(
+    client: httpx.AsyncClient,
+    url: str,
+    max_length: int = 3000
+) -> Dict[str, Any]:
+    """
+    Fetch a URL and extract its text content and metadata (see parse_page).
+    Falls back to default values if the page can't be fetched or parsed.
+    """
+    cache_key = (url, max_length)
+    cached = _extract_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+    
+    stored = None
+    headers = {}
+    if EXTRACT_S3_CACHE_TTL > 0:
+        stored = await asyncio.to_thread(load_stored_extraction, url, max_length)
+        if stored is not None:
+            if time.time() - stored[1] < EXTRACT_S3_CACHE_TTL:
+                _extract_cache.put(cache_key, dict(stored[0]))
+                return dict(stored[0])
+            # Stale: let the origin answer 304 if the page hasn't changed since
+            headers['If-Modified-Since'] = formatdate(stored[1], usegmt=True)
+    
+    try:
+        html = None
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code != 304 or stored is None:
+                response.raise_for_status()
+                
+                content_type = response.headers.get("content-type", "")
+                if content_type and "html" not in content_type:
+                    logger.info(f"Skipping non-HTML content ({content_type}) at {url}")
+                    return _empty_extraction()
+                
+                # Only the start of a page is kept, so stop downloading past the cap
+                html = bytearray()
+                async for chunk in response.aiter_bytes(65536):
+                    html.extend(chunk)
+                    if len(html) >= EXTRACT_MAX_BYTES:
+                        break
         
-        result["content"] = text if len(text) > 100 else None
+        if html is None:
+            result = stored[0]
+        else:
+            # Parsing is CPU-bound; keep it off the event loop
+            result = await asyncio.to_thread(parse_page, bytes(html[:EXTRACT_MAX_BYTES]), max_length)
         
-        return result
+        # Failed fetches are not cached so they are retried next time.
+        # Re-storing a 304 result refreshes its timestamp
+        if EXTRACT_S3_CACHE_TTL > 0:
+            await asyncio.to_thread(store_extraction, url, max_length, result)
+        _extract_cache.put(cache_key, dict(result))
+        return dict(result)
         
     except Exception as e:
         logger.warning(f"Failed to extract content from {url}: {e}")
-        return result
+        return _empty_extraction()
 
 
-def upload_to_s3(content: str, resource_id: str) -> Optional[str]:
-    """Upload content snippet to S3 and return the key"""
-    try:
-        s3_client = boto3.client(
+# URL fetches during ingestion run concurrently, with a per-host cap so a
+# batch of links to one site doesn't trip its rate limiting
+EXTRACT_MAX_CONCURRENCY = 16
+EXTRACT_MAX_PER_HOST = 4
+
+
+async def extract_contents(client: httpx.AsyncClient, urls: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Extract content for several URLs concurrently; returns results keyed by URL"""
+    unique_urls = list(dict.fromkeys(urls))
+    limit = asyncio.Semaphore(EXTRACT_MAX_CONCURRENCY)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(EXTRACT_MAX_PER_HOST))
+    
+    async def fetch(url: str) -> Dict[str, Any]:
+        async with host_limits[urlsplit(url).netloc], limit:
+            return await extract_content_from_url(client, url)
+    
+    results = await asyncio.gather(*map(fetch, unique_urls))
+    return dict(zip(unique_urls, results))
+
+
+S3_UPLOAD_MAX_WORKERS = 16
+
+# Snippets below the threshold go up in a single PutObject; larger bodies use
+# multipart upload so parts are sent in parallel
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 5 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+_S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=8
+)
+
+# Shared S3 client; boto3 clients are thread-safe, so concurrent uploads reuse its pool
+_s3_client = None
+
+
+def get_s3_client():
+    """Get or create the S3 client used for snippet uploads"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client(
             's3',
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
+            region_name=os.getenv('AWS_REGION', 'us-east-1'),
+            config=BotoConfig(max_pool_connections=S3_UPLOAD_MAX_WORKERS)
         )
-        
+    return _s3_client
+
+
+def snippet_key(resource_id: str) -> str:
+    """
+    S3 key for a resource snippet
+    
+    Keys are spread over 65536 hash prefixes (snippets/ab/cd/<id>.txt) so bulk
+    uploads don't concentrate on one S3 partition. Readers use the key stored
+    in resource.snippet_s3_key, so the layout can change without touching them.
+    """
+    h = hashlib.blake2s(resource_id.encode(), digest_size=2).hexdigest()
+    return f"snippets/{h[:2]}/{h[2:4]}/{resource_id}.txt"
+
+
+def upload_to_s3(content: str, resource_id: str) -> Optional[str]:
+    """Upload content snippet to S3 and return the key"""
+    try:
         bucket_name = os.getenv('S3_BUCKET_NAME', 'learnpath-snippets')
-        s3_key = f"snippets/{resource_id}.txt"
+        s3_key = snippet_key(resource_id)
         
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=s3_key,
-            Body=content.encode('utf-8'),
-            ContentType='text/plain'
-        )
+        body = content.encode('utf-8')
+        if len(body) < S3_MULTIPART_THRESHOLD:
+            get_s3_client().put_object(
+                Bucket=bucket_name,
+                Key=s3_key,
+                Body=body,
+                ContentType='text/plain'
+            )
+        else:
+            get_s3_client().upload_fileobj(
+                io.BytesIO(body),
+                bucket_name,
+                s3_key,
+                ExtraArgs={'ContentType': 'text/plain'},
+                Config=_S3_TRANSFER_CONFIG
+            )
         
         logger.info(f"Uploaded content to S3: {s3_key}")
         return s3_key
@@ -425,6 +738,107 @@ def upload_to_s3(content: str, resource_id: str) -> Optional[str]:
         return None
 
 
+def upload_snippets(uploads: Dict[str, Tuple[str, str]]) -> Dict[str, Optional[str]]:
+    """Upload several (content, resource_id) snippets concurrently; returns S3 keys by the same keys"""
+    if not uploads:
+        return {}
+    workers = min(S3_UPLOAD_MAX_WORKERS, len(uploads))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-upload") as executor:
+        futures = {executor.submit(upload_to_s3, *args): key for key, args in uploads.items()}
+        results = {}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+        return results
+
+
+# slug -> skill id, shared across requests. ingest_skills merges the rows it
+# writes after committing; a slug missing here triggers one reload, which
+# covers skills added by other instances
+_skill_map: Dict[str, str] = {}
+_skill_map_loaded = False
+_skill_map_lock = threading.Lock()
+
+
+def get_skill_map(cur, slugs: List[str]) -> Dict[str, str]:
+    """Return the cached slug -> id map, reloading it if any of the slugs are unknown"""
+    global _skill_map, _skill_map_loaded
+    with _skill_map_lock:
+        if _skill_map_loaded and all(slug in _skill_map for slug in slugs):
+            return dict(_skill_map)
+    
+    # Query outside the lock so a slow reload never stalls other callers
+    # (ingest_skills runs on the event loop); only the swap is locked
+    cur.execute("SELECT id, slug FROM skill")
+    loaded = {row['slug']: str(row['id']) for row in cur.fetchall()}
+    with _skill_map_lock:
+        _skill_map = loaded
+        _skill_map_loaded = True
+        return dict(loaded)
+
+
+def update_skill_map(skills: Dict[str, str]):
+    """Merge committed slug -> id rows into the cached map"""
+    with _skill_map_lock:
+        _skill_map.update(skills)
+
+
+# Batches above this size are loaded with COPY into a staging table instead
+# of multi-row INSERTs; COPY skips per-statement parsing and planning
+COPY_THRESHOLD = 1000
+
+
+def _array_element(value: Any) -> str:
+    """Quote one element of a Postgres array literal"""
+    if value is None:
+        return 'NULL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _copy_field(value: Any) -> str:
+    """Format one value for COPY ... WITH (FORMAT csv); unquoted empty is NULL"""
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        value = '{' + ','.join(map(_array_element, value)) + '}'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def upsert_rows(
+    cur,
+    table: str,
+    columns: List[str],
+    rows: List[tuple],
+    on_conflict: str,
+    template: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    INSERT rows into table with the given ON CONFLICT ... RETURNING clause
+    
+    Large batches are COPYed into a temp table (dropped on commit) and
+    upserted with INSERT ... SELECT; smaller ones use execute_values.
+    """
+    column_list = ', '.join(columns)
+    if len(rows) <= COPY_THRESHOLD:
+        return execute_values(
+            cur, f"INSERT INTO {table} ({column_list}) VALUES %s {on_conflict}",
+            rows, template=template, page_size=1000, fetch=True
+        )
+    
+    # The staging table lives until commit, so a second COPY-path call in the
+    # same transaction replaces it rather than failing on the existing name
+    stage = f"{table}_stage"
+    cur.execute(f"DROP TABLE IF EXISTS pg_temp.{stage}")
+    cur.execute(f"CREATE TEMP TABLE {stage} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(','.join(map(_copy_field, row)))
+        buf.write('\n')
+    buf.seek(0)
+    cur.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN WITH (FORMAT csv)", buf)
+    cur.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {stage} {on_conflict}")
+    return cur.fetchall()
+
+
 @app.post("/ingest/skills", response_model=IngestResponse)
 async def ingest_skills(request: IngestSkillsRequest):
     """
@@ -437,66 +851,80 @@ async def ingest_skills(request: IngestSkillsRequest):
     
     try:
         with conn.cursor() as cur:
-            # Create a map of existing skills
-            cur.execute("SELECT id, slug FROM skill")
-            existing_skills = {slug: str(skill_id) for skill_id, slug in cur.fetchall()}
+            # Map of existing skills (cached); prerequisites may refer to skills
+            # outside this request. Ones defined in the request are added by the
+            # upsert below, so they must not force a reload
+            request_slugs = {skill.slug for skill in request.skills}
+            existing_skills = get_skill_map(cur, [
+                slug for skill in request.skills for slug in skill.prerequisites or []
+                if slug not in request_slugs
+            ])
             
-            for skill in request.skills:
-                try:
-                    skill_id = str(uuid.uuid4())
-                    
-                    # Insert or update skill
-                    cur.execute("""
-                        INSERT INTO skill (id, name, slug, level_hint, description, tenant_id)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (slug) DO UPDATE
-                        SET name = EXCLUDED.name,
-                            level_hint = EXCLUDED.level_hint,
-                            description = EXCLUDED.description,
-                            tenant_id = EXCLUDED.tenant_id,
-                            updated_at = NOW()
-                        RETURNING id
-                    """, (skill_id, skill.name, skill.slug, skill.level_hint, skill.description, skill.tenant_id))
-                    
-                    result = cur.fetchone()
-                    if result:
-                        skill_id = str(result['id'])
-                    
-                    existing_skills[skill.slug] = skill_id
-                    success_count += 1
-                    
-                except Exception as e:
-                    failed_count += 1
-                    errors.append(f"Failed to insert skill {skill.slug}: {str(e)}")
-                    logger.error(f"Failed to insert skill {skill.slug}: {e}")
+            # One row per slug (last wins): a single upsert statement cannot
+            # touch the same row twice
+            skills_by_slug = {skill.slug: skill for skill in request.skills}
+            rows = [
+                (str(uuid.uuid4()), s.name, s.slug, s.level_hint, s.description, s.tenant_id)
+                for s in skills_by_slug.values()
+            ]
+            
+            # Insert or update all skills in one statement
+            try:
+                upserted = upsert_rows(
+                    cur, "skill",
+                    ["id", "name", "slug", "level_hint", "description", "tenant_id"],
+                    rows, """
+                    ON CONFLICT (slug) DO UPDATE
+                    SET name = EXCLUDED.name,
+                        level_hint = EXCLUDED.level_hint,
+                        description = EXCLUDED.description,
+                        tenant_id = EXCLUDED.tenant_id,
+                        updated_at = NOW()
+                    RETURNING id, slug
+                """)
+                
+                upserted_skills = {row['slug']: str(row['id']) for row in upserted}
+                existing_skills.update(upserted_skills)
+                success_count = len(request.skills)
+                
+            except Exception as e:
+                conn.rollback()
+                upserted_skills = {}
+                failed_count = len(request.skills)
+                errors.append(f"Failed to insert skills: {str(e)}")
+                logger.error(f"Failed to insert skills: {e}")
+                skills_by_slug = {}
             
             # Insert prerequisite relationships
-            for skill in request.skills:
-                if skill.prerequisites:
-                    skill_id = existing_skills.get(skill.slug)
-                    if not skill_id:
-                        continue
-                    
-                    for prereq_slug in skill.prerequisites:
-                        prereq_id = existing_skills.get(prereq_slug)
-                        if prereq_id:
-                            try:
-                                cur.execute("""
-                                    INSERT INTO skill_edge (from_skill, to_skill)
-                                    VALUES (%s, %s)
-                                    ON CONFLICT DO NOTHING
-                                """, (prereq_id, skill_id))
-                            except Exception as e:
-                                logger.warning(f"Failed to insert prerequisite edge: {e}")
+            edges = set()
+            for skill in skills_by_slug.values():
+                skill_id = existing_skills.get(skill.slug)
+                if not skill_id:
+                    continue
+                for prereq_slug in skill.prerequisites or []:
+                    prereq_id = existing_skills.get(prereq_slug)
+                    if prereq_id:
+                        edges.add((prereq_id, skill_id))
+            
+            if edges:
+                try:
+                    execute_values(cur, """
+                        INSERT INTO skill_edge (from_skill, to_skill)
+                        VALUES %s
+                        ON CONFLICT DO NOTHING
+                    """, list(edges), page_size=1000)
+                except Exception as e:
+                    logger.warning(f"Failed to insert prerequisite edges: {e}")
             
             conn.commit()
+            update_skill_map(upserted_skills)
             
     except Exception as e:
         conn.rollback()
         logger.error(f"Transaction failed: {e}")
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
     finally:
-        conn.close()
+        release_db_connection(conn)
     
     return IngestResponse(
         success=success_count,
@@ -511,6 +939,20 @@ async def ingest_resources(request: IngestResourcesRequest):
     """
     Ingest resources into the database and optionally generate embeddings
     """
+    # Fetch all URLs on the event loop first; the blocking database, S3 and
+    # embedding work then runs in a worker thread
+    extracted_by_url = (
+        await extract_contents(app.state.http, [r.url for r in request.resources])
+        if request.extract_content else {}
+    )
+    return await asyncio.to_thread(store_resources, request, extracted_by_url)
+
+
+def store_resources(
+    request: IngestResourcesRequest,
+    extracted_by_url: Dict[str, Dict[str, Any]]
+) -> IngestResponse:
+    """Insert resources, upload their snippets and index their embeddings"""
     try:
         conn = get_db_connection()
         logger.info(f"Database connection established for ingesting {len(request.resources)} resources")
@@ -524,18 +966,26 @@ async def ingest_resources(request: IngestResourcesRequest):
     
     try:
         with conn.cursor() as cur:
-            # Get skill mapping
-            cur.execute("SELECT id, slug FROM skill")
-            skill_map = {slug: str(skill_id) for skill_id, slug in cur.fetchall()}
+            # Get skill mapping (cached across requests)
+            requested_slugs = {slug for r in request.resources for slug in r.skills}
+            skill_map = get_skill_map(cur, list(requested_slugs))
             
+            # Warn once per unknown slug rather than once per resource
+            for slug in sorted(requested_slugs - skill_map.keys()):
+                logger.warning(f"Skill slug '{slug}' not found; skipping it for this batch")
+            
+            # Pass 1: fill in extracted metadata and build rows.
+            # One row per URL (last wins): a single upsert cannot touch a row twice
+            resources_by_url: Dict[str, Resource] = {}
+            rows_by_url: Dict[str, tuple] = {}
+            pending_snippets: Dict[str, str] = {}
             for resource in request.resources:
                 try:
                     resource_id = str(uuid.uuid4())
-                    s3_key = None
                     
                     # Extract content first (if requested) to get metadata
                     if request.extract_content:
-                        extracted = extract_content_from_url(resource.url)
+                        extracted = extracted_by_url[resource.url]
                         
                         # Update title if missing or just URL
                         if extracted["title"] and (not resource.title or resource.title == resource.url):
@@ -549,41 +999,15 @@ async def ingest_resources(request: IngestResourcesRequest):
                         if not resource.duration_min and extracted["estimated_duration_min"]:
                             resource.duration_min = extracted["estimated_duration_min"]
                             
-                        # Upload content to S3
+                        # Queue content for upload to S3
                         if extracted["content"]:
-                            s3_key = upload_to_s3(extracted["content"], resource_id)
+                            pending_snippets[resource.url] = extracted["content"]
                     
                     # Resolve skill IDs
-                    skill_ids = []
-                    for slug in resource.skills:
-                        if slug in skill_map:
-                            skill_ids.append(skill_map[slug])
-                        else:
-                            # logger.warning(f"Skill slug '{slug}' not found for resource {resource.title}")
-                            pass
+                    skill_ids = [skill_map[slug] for slug in resource.skills if slug in skill_map]
                     
-                    # Insert resource into PostgreSQL
-                    logger.info(f"Inserting resource: {resource.title} (URL: {resource.url})")
-                    cur.execute("""
-                        INSERT INTO resource (
-                            id, title, url, provider, license, duration_min,
-                            level, skills, media_type, description, tenant_id, snippet_s3_key
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s::uuid[], %s, %s, %s, %s)
-                        ON CONFLICT (url) DO UPDATE
-                        SET title = EXCLUDED.title,
-                            provider = EXCLUDED.provider,
-                            license = EXCLUDED.license,
-                            duration_min = EXCLUDED.duration_min,
-                            level = EXCLUDED.level,
-                            skills = EXCLUDED.skills,
-                            media_type = EXCLUDED.media_type,
-                            description = EXCLUDED.description,
-                            tenant_id = EXCLUDED.tenant_id,
-                            snippet_s3_key = COALESCE(EXCLUDED.snippet_s3_key, resource.snippet_s3_key),
-                            updated_at = NOW()
-                        RETURNING id
-                    """, (
+                    resources_by_url[resource.url] = resource
+                    rows_by_url[resource.url] = (
                         resource_id,
                         resource.title,
                         resource.url,
@@ -594,63 +1018,105 @@ async def ingest_resources(request: IngestResourcesRequest):
                         skill_ids,
                         resource.media_type,
                         resource.description,
-                        resource.tenant_id,
-                        s3_key
-                    ))
-                    
-                    result = cur.fetchone()
-                    if result:
-                        resource_id = str(result['id'])
-                        logger.info(f"Resource inserted/updated with ID: {resource_id}")
-                    
-                    # Generate embeddings and store in Qdrant if requested
-                    if request.generate_embeddings:
-                        try:
-                            # Prepare text for embedding
-                            text = resource.title
-                            if resource.description:
-                                text += f" {resource.description}"
-                            
-                            # Generate embedding
-                            embedding_service = get_embedding_service()
-                            embeddings = embedding_service.generate_embeddings([f"passage: {text}"])
-                            
-                            # Store in Qdrant
-                            search_service = get_search_service()
-                            search_service.connect()  # Ensure connection is established
-                            search_service.client.upsert(
-                                collection_name=settings.qdrant_collection,
-                                points=[{
-                                    "id": resource_id,
-                                    "vector": embeddings[0],
-                                    "payload": {
-                                        "resource_id": resource_id,
-                                        "title": resource.title,
-                                        "url": resource.url,
-                                        "provider": resource.provider,
-                                        "license": resource.license,
-                                        "duration_min": resource.duration_min,
-                                        "level": resource.level,
-                                        "skills": resource.skills,
-                                        "media_type": resource.media_type,
-                                        "description": resource.description,
-                                        "tenant_id": resource.tenant_id
-                                    }
-                                }]
-                            )
-                            
-                            logger.info(f"Generated embedding and stored in Qdrant for {resource.title}")
-                            
-                        except Exception as e:
-                            logger.warning(f"Failed to generate embedding for {resource.title}: {e}")
-                            # Don't fail the whole ingestion if embedding fails
-                    
-                    success_count += 1
+                        resource.tenant_id
+                    )
                     
                 except Exception as e:
                     failed_count += 1
-                    errors.append(f"Failed to insert resource {resource.url}: {str(e)}")
-                    logger.error(f"Failed to insert resource {resource.url}: {e}")
+                    errors.append(f"Failed to prepare resource {resource.url}: {str(e)}")
+                    logger.error(f"Failed to prepare resource {resource.url}: {e}")
+            
+            # Pass 2: insert or update every resource in one statement
+            rows = list(rows_by_url.values())
+            logger.info(f"Inserting {len(rows)} resources")
+            inserted = upsert_rows(
+                cur, "resource",
+                ["id", "title", "url", "provider", "license", "duration_min",
+                 "level", "skills", "media_type", "description", "tenant_id"],
+                rows, """
+                ON CONFLICT (url) DO UPDATE
+                SET title = EXCLUDED.title,
+                    provider = EXCLUDED.provider,
+                    license = EXCLUDED.license,
+                    duration_min = EXCLUDED.duration_min,
+                    level = EXCLUDED.level,
+                    skills = EXCLUDED.skills,
+                    media_type = EXCLUDED.media_type,
+                    description = EXCLUDED.description,
+                    tenant_id = EXCLUDED.tenant_id,
+                    updated_at = NOW()
+                RETURNING id, url
+            """, template="(%s, %s, %s, %s, %s, %s, %s, %s::uuid[], %s, %s, %s)")
+            # On a URL conflict the existing row keeps its id, so everything
+            # downstream is keyed by the returned ids, not the ones generated above
+            resource_ids = {row['url']: str(row['id']) for row in inserted}
+            
+            # Upload snippets concurrently under their row ids, then record the keys.
+            # Keys derive from the id, so re-ingesting a URL overwrites its object
+            s3_keys = upload_snippets({
+                url: (content, resource_ids[url])
+                for url, content in pending_snippets.items() if url in resource_ids
+            })
+            uploaded = [(resource_ids[url], key) for url, key in s3_keys.items() if key]
+            if uploaded:
+                execute_values(cur, """
+                    UPDATE resource SET snippet_s3_key = v.snippet_s3_key
+                    FROM (VALUES %s) AS v(id, snippet_s3_key)
+                    WHERE resource.id = v.id::uuid
+                """, uploaded)
+            success_count = len(request.resources) - failed_count
+            
+            # Pass 3: embed all resources in one call and store them in Qdrant with one upsert
+            if request.generate_embeddings and resource_ids:
+                embedding_service = app.state.embedding_service
+                urls = list(resource_ids)
+                texts = []
+                for url in urls:
+                    resource = resources_by_url[url]
+                    text = resource.title
+                    if resource.description:
+                        text += f" {resource.description}"
+                    texts.append(f"passage: {text}")
+                
+                points = []
+                try:
+                    embeddings = embedding_service.generate_embeddings(texts, already_prefixed=True)
+                    for url, vector in zip(urls, embeddings):
+                        resource = resources_by_url[url]
+                        resource_id = resource_ids[url]
+                        points.append({
+                            "id": resource_id,
+                            "vector": vector.tolist(),
+                            "payload": {
+                                "resource_id": resource_id,
+                                "title": resource.title,
+                                "url": resource.url,
+                                "provider": resource.provider,
+                                "license": resource.license,
+                                "duration_min": resource.duration_min,
+                                "level": resource.level,
+                                "skills": resource.skills,
+                                "media_type": resource.media_type,
+                                "description": resource.description,
+                                "tenant_id": resource.tenant_id
+                            }
+                        })
+                except Exception as e:
+                    logger.warning(f"Failed to generate embeddings for {len(texts)} resources: {e}")
+                    # Don't fail the whole ingestion if embedding fails
+                
+                if points:
+                    try:
+                        # Connected once in lifespan
+                        app.state.search_service.client.upsert(
+                            collection_name=settings.qdrant_collection,
+                            points=points
+                        )
+                        logger.info(f"Stored {len(points)} embeddings in Qdrant")
+                        # Make the new resources searchable right away
+                        app.state.search_service.clear_cache()
+                    except Exception as e:
+                        logger.warning(f"Failed to store embeddings in Qdrant: {e}")
             
             logger.info(f"Committing transaction for {success_count} resources")
             conn.commit()
@@ -665,7 +1131,7 @@ async def ingest_resources(request: IngestResourcesRequest):
             logger.error(f"Rollback failed: {rollback_error}")
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
     finally:
-        conn.close()
+        release_db_connection(conn)
     
     return IngestResponse(
         success=success_count,
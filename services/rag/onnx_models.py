@@ -0,0 +1,182 @@
+"""
+ONNX Runtime inference for the local embedding and reranker models
+Used instead of PyTorch eager mode when USE_ONNX=true
+"""
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _export_dir(cache_dir: str, model_id: str) -> str:
+    """Directory holding the exported ONNX graph for a model id or path"""
+    return os.path.join(cache_dir, model_id.strip("/").replace("/", "__"))
+
+
+def prepare_onnx(model_id: str, cache_dir: str, quantize: bool, ort_model_cls: str) -> str:
+    """
+    Export (and optionally INT8-quantize) the model once, reusing the cached graph
+
+    Called at model load, and by quantize_models.py at image build time so
+    containers start with the graphs already in cache_dir.
+    """
+    export_dir = _export_dir(cache_dir, model_id)
+    onnx_path = os.path.join(export_dir, "model.onnx")
+    quantized_path = os.path.join(export_dir, "model_quantized.onnx")
+
+    if not os.path.exists(onnx_path):
+        import optimum.onnxruntime
+        from transformers import AutoTokenizer
+
+        logger.info(f"Exporting {model_id} to ONNX at {export_dir}")
+        ort_model = getattr(optimum.onnxruntime, ort_model_cls)
+        ort_model.from_pretrained(model_id, export=True).save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(export_dir)
+
+    if not quantize:
+        return onnx_path
+
+    if not os.path.exists(quantized_path):
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        logger.info("Applying dynamic INT8 quantization to ONNX graph")
+        # VNNI int8 dot products where the CPU supports them
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+        ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx").quantize(
+            save_dir=export_dir, quantization_config=qconfig
+        )
+    return quantized_path
+
+
+def _create_session(model_path: str, num_threads: Optional[int] = None):
+    """
+    CPU inference session with full graph optimization
+
+    num_threads caps the intra-op pool; by default it follows OMP_NUM_THREADS
+    (set per process by rerank.py when WEB_CONCURRENCY > 1), else one thread per core.
+    """
+    import onnxruntime as ort
+
+    if not num_threads:
+        num_threads = int(os.environ.get("OMP_NUM_THREADS") or os.cpu_count() or 1)
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_options.intra_op_num_threads = num_threads
+    logger.info(f"ONNX Runtime intra-op threads: {num_threads}")
+    return ort.InferenceSession(model_path, sess_options, providers=["CPUExecutionProvider"])
+
+
+class OnnxEmbeddingModel:
+    """
+    e5 encoder running under onnxruntime
+
+    Exposes the subset of SentenceTransformer.encode() that EmbeddingService
+    uses. Pooling matches the e5 sentence-transformers pipeline: mean over
+    non-padding tokens followed by L2 normalization.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        cache_dir: str,
+        quantize: bool = True,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None
+    ):
+        from transformers import AutoTokenizer
+
+        self.max_seq_length = max_seq_length
+        model_path = prepare_onnx(model_id, cache_dir, quantize, "ORTModelForFeatureExtraction")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+        self.session = _create_session(model_path, num_threads)
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Loaded ONNX embedding model from {model_path}")
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        """Embed texts; returns a float32 array of shape (len(texts), dimension)"""
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            # Fixed sequence length keeps tensor shapes stable so ORT reuses its kernels
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding="max_length",
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feed = {k: v for k, v in encoded.items() if k in self._input_names}
+            hidden = self.session.run(None, feed)[0]
+
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled.astype(np.float32, copy=False))
+
+        return np.concatenate(outputs) if outputs else np.empty((0, 0), dtype=np.float32)
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder reranker running under onnxruntime
+
+    Exposes the subset of CrossEncoder.predict() that RerankService uses.
+    The relevance logit goes through the sigmoid CrossEncoder applies by
+    default, so scores are comparable with the PyTorch path.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        cache_dir: str,
+        quantize: bool = True,
+        max_seq_length: int = 512,
+        num_threads: Optional[int] = None
+    ):
+        from transformers import AutoTokenizer
+
+        self.max_seq_length = max_seq_length
+        model_path = prepare_onnx(model_id, cache_dir, quantize, "ORTModelForSequenceClassification")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+        self.session = _create_session(model_path, num_threads)
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Loaded ONNX reranker model from {model_path}")
+
+    def predict(
+        self,
+        pairs: List[List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False
+    ) -> np.ndarray:
+        """Score (query, document) pairs; returns a float32 array of shape (len(pairs),)"""
+        outputs = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            # Pairs vary widely in length, so pad to the longest in the batch only
+            encoded = self.tokenizer(
+                [query for query, _ in batch],
+                [text for _, text in batch],
+                padding=True,
+                truncation="only_second",
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feed = {k: v for k, v in encoded.items() if k in self._input_names}
+            logits = self.session.run(None, feed)[0]
+            outputs.append(logits[:, 0])
+
+        if not outputs:
+            return np.empty(0, dtype=np.float32)
+        scores = np.concatenate(outputs).astype(np.float32, copy=False)
+        return 1.0 / (1.0 + np.exp(-scores))
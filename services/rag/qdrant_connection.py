@@ -0,0 +1,56 @@
+"""
+Shared Qdrant client
+One client per process so connections are reused across requests and scripts
+"""
+import logging
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Singleton instances
+_qdrant_client = None
+_async_qdrant_client = None
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Get or create the Qdrant client"""
+    global _qdrant_client
+    if _qdrant_client is None:
+        settings = get_settings()
+        logger.info(f"Connecting to Qdrant at {settings.qdrant_url} (prefer_grpc={settings.qdrant_prefer_grpc})")
+        # gRPC skips JSON encoding of vectors and keeps a single HTTP/2 channel open
+        _qdrant_client = QdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            prefer_grpc=settings.qdrant_prefer_grpc,
+            grpc_port=settings.qdrant_grpc_port,
+            timeout=30
+        )
+    return _qdrant_client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Get or create the asyncio Qdrant client used on the request path"""
+    global _async_qdrant_client
+    if _async_qdrant_client is None:
+        settings = get_settings()
+        _async_qdrant_client = AsyncQdrantClient(
+            url=settings.qdrant_url,
+            api_key=settings.qdrant_api_key,
+            prefer_grpc=settings.qdrant_prefer_grpc,
+            grpc_port=settings.qdrant_grpc_port,
+            timeout=30
+        )
+    return _async_qdrant_client
+
+
+def warm_qdrant_client() -> bool:
+    """Open the connection ahead of the first request; returns False if Qdrant is unreachable"""
+    try:
+        get_qdrant_client().get_collections()
+        return True
+    except Exception as e:
+        logger.warning(f"Qdrant warm-up failed: {e}")
+        return False
@@ -1,22 +1,76 @@
 """
 Reranking with Deep Infra API or local fallback
 """
+import asyncio
+import contextlib
+import hashlib
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple
 
+import numpy as np
+
+from batching import AsyncBatcher
+from caching import LRUCache
 from config import get_settings
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
+
+# Rough chars-per-token for English text; used to cut documents without a tokenizer
+_CHARS_PER_TOKEN = 4
+
+# Uvicorn workers (WEB_CONCURRENCY) are separate processes, each with its own
+# model and thread pools, so each process only gets its share of the cores
+_WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY") or 1))
+
+
+def _process_cores() -> int:
+    """CPU thread budget for this process (OMP_NUM_THREADS, else cores / WEB_CONCURRENCY)"""
+    return int(os.environ.get("OMP_NUM_THREADS") or max(1, (os.cpu_count() or 1) // _WEB_CONCURRENCY))
+
+
+if _WEB_CONCURRENCY > 1:
+    # Read by OpenMP/MKL when torch is first imported (lazily, on model load);
+    # otherwise every worker's pools would default to all cores
+    for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(_var, str(_process_cores()))
+
+
+def _set_torch_threads(torch, workers: int):
+    """Split the process's thread budget between the rerank workers"""
+    num_threads = max(1, _process_cores() // workers)
+    torch.set_num_threads(num_threads)
+    try:
+        # One request's forward pass at a time; extra inter-op threads only contend
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Can only be set before the first parallel op in the process
+    logger.info(
+        f"PyTorch CPU threads: {num_threads} x {workers} rerank workers "
+        f"(WEB_CONCURRENCY={_WEB_CONCURRENCY})"
+    )
 
 
 class RerankService:
     """Service for reranking search results via API or local model"""
     
     def __init__(self):
-        self.use_deepinfra = settings.use_deepinfra
+        self.settings = get_settings()
+        self.use_deepinfra = self.settings.use_deepinfra
         self._local_model = None  # Lazy loaded only if needed
         self._deepinfra_client = None
+        self._batcher = None  # Created on first async local call
+        # Local model calls from the async path run here, not in the default
+        # executor; each worker gets an equal share of the cores (see _set_torch_threads)
+        self._workers = self.settings.rerank_max_workers or max(1, _process_cores() // 2)
+        self._executor = None
+        self._load_lock = threading.Lock()
+        self._torch_model = False  # Local model is a PyTorch CrossEncoder (vs ONNX)
+        self._autocast_dtype = None  # Mixed-precision forward (local model on CUDA)
+        # Scores for recently seen (query, documents) pairs
+        self._score_cache = LRUCache(self.settings.rerank_cache_size, ttl=self.settings.rerank_cache_ttl)
         
         if self.use_deepinfra:
             logger.info("RerankService initialized with Deep Infra API")
@@ -30,31 +84,73 @@ class RerankService:
             self._deepinfra_client = get_deepinfra_client()
         return self._deepinfra_client
     
+    def _get_batcher(self) -> AsyncBatcher:
+        """Lazy create the micro-batcher that scores concurrent requests in one model call"""
+        if self._batcher is None:
+            self._batcher = AsyncBatcher(
+                self._arerank_local_batch,
+                max_batch=self.settings.rerank_batch_max_size,
+                max_wait_ms=self.settings.rerank_batch_wait_ms,
+                timeout=self.settings.inference_timeout
+            )
+        return self._batcher
+    
+    def load(self):
+        """Load the local model now instead of on the first rerank (no-op on the API path)"""
+        if not self.use_deepinfra:
+            self._load_local_model()
+    
     def _load_local_model(self):
         """Load local CrossEncoder model (fallback)"""
         if self._local_model is None:
+            # Rerank workers can race on the first request; load only once
+            with self._load_lock:
+                self._create_local_model()
+        return self._local_model
+    
+    def _create_local_model(self):
+        if self._local_model is None:
+            if self.settings.use_onnx:
+                from onnx_models import OnnxCrossEncoder
+                
+                logger.info(f"Loading local reranker model with ONNX Runtime: {self.settings.reranker_model}")
+                self._local_model = OnnxCrossEncoder(
+                    self.settings.reranker_model,
+                    cache_dir=self.settings.onnx_cache_dir,
+                    quantize=self.settings.use_quantization and self.settings.quantization_config != "none",
+                    max_seq_length=self.settings.onnx_rerank_max_seq_length,
+                    # Same split as the PyTorch path: the rerank workers share the budget
+                    num_threads=max(1, _process_cores() // self._workers)
+                )
+                logger.info("✓ Local reranker model ready")
+                return self._local_model
+            
             import torch
             from sentence_transformers import CrossEncoder
             
             device = "cuda" if torch.cuda.is_available() else "cpu"
-            logger.info(f"Loading local reranker model: {settings.reranker_model} on {device}")
+            logger.info(f"Loading local reranker model: {self.settings.reranker_model} on {device}")
+            
+            if device == "cpu":
+                _set_torch_threads(torch, self._workers)
             
-            self._local_model = CrossEncoder(settings.reranker_model, device=device)
+            self._local_model = CrossEncoder(self.settings.reranker_model, device=device)
+            self._torch_model = True
             
-            # Apply quantization if enabled
-            if settings.use_quantization and settings.quantization_config != "none":
-                if device == "cpu":
-                    if hasattr(self._local_model, 'model'):
-                        self._local_model.model = torch.quantization.quantize_dynamic(
-                            self._local_model.model,
-                            {torch.nn.Linear},
-                            dtype=torch.qint8
-                        )
-                        logger.info("✓ Applied INT8 quantization to reranker")
-                else:
-                    if hasattr(self._local_model, 'model') and hasattr(self._local_model.model, 'half'):
-                        self._local_model.model = self._local_model.model.half()
-                        logger.info("✓ Using FP16 precision for reranker")
+            # On CPU the model stays FP32: dynamic INT8 in PyTorch leaves attention
+            # unquantized and is often slower; INT8 is served by the ONNX path
+            if device == "cuda":
+                # TF32 tensor cores for any FP32 matmuls left outside autocast
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.set_float32_matmul_precision("high")
+                
+                # Autocast rather than .half(): weights, LayerNorm and softmax stay FP32
+                quantize = self.settings.use_quantization and self.settings.quantization_config != "none"
+                if quantize:
+                    # BF16 on Ampere and newer (wider range), FP16 before that
+                    major, _ = torch.cuda.get_device_capability()
+                    self._autocast_dtype = torch.bfloat16 if major >= 8 else torch.float16
+                    logger.info(f"✓ Using {self._autocast_dtype} autocast for reranker")
             
             logger.info("✓ Local reranker model ready")
         
@@ -79,28 +175,99 @@ class RerankService:
         """
         if not documents:
             return [], []
+        if self.settings.rerank_skip_when_small and len(documents) <= top_n:
+            return self._passthrough(documents)
         
-        # Extract text from documents
-        doc_texts = []
-        for doc in documents:
-            doc_text = doc.get("title", "")
-            if doc.get("description"):
-                doc_text += " " + doc["description"]
-            doc_texts.append(doc_text)
+        doc_texts = self._document_texts(documents)
+        cache_key = self._score_key(query, doc_texts)
+        scores = self._score_cache.get(cache_key)
         
         # Get scores via API or local model
-        if self.use_deepinfra:
-            scores = self._rerank_via_api(query, doc_texts)
-        else:
-            scores = self._rerank_local(query, doc_texts)
+        if scores is None:
+            if self.use_deepinfra:
+                scores = self._rerank_via_api(query, doc_texts)
+            else:
+                scores = self._rerank_local(query, doc_texts)
+            self._score_cache.put(cache_key, scores)
+        
+        return self._select_top(documents, scores, top_n)
+    
+    async def arerank(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        top_n: int = 5
+    ) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Async version of rerank (API call is awaited, local model runs in a thread)"""
+        if not documents:
+            return [], []
+        if self.settings.rerank_skip_when_small and len(documents) <= top_n:
+            return self._passthrough(documents)
         
-        # Sort by score (descending)
-        scored_docs = list(zip(documents, scores))
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        doc_texts = self._document_texts(documents)
+        cache_key = self._score_key(query, doc_texts)
+        scores = self._score_cache.get(cache_key)
         
-        # Return top N
-        top_docs = [doc for doc, _ in scored_docs[:top_n]]
-        top_scores = [float(score) for _, score in scored_docs[:top_n]]
+        if scores is None:
+            if self.use_deepinfra:
+                scores = await self._get_deepinfra_client().rerank(query, doc_texts)
+            else:
+                scores = await self._get_batcher().submit((query, doc_texts))
+            self._score_cache.put(cache_key, scores)
+        
+        return self._select_top(documents, scores, top_n)
+    
+    @staticmethod
+    def _passthrough(documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Keep retrieval order and scores when every document would be returned anyway"""
+        return list(documents), [float(doc.get("score") or 0.0) for doc in documents]
+    
+    def clear_cache(self):
+        """Drop cached rerank scores"""
+        self._score_cache.clear()
+    
+    @staticmethod
+    def _score_key(query: str, doc_texts: List[str]) -> bytes:
+        """Digest of the query and the exact texts scored, in order"""
+        h = hashlib.blake2b(query.encode(), digest_size=16)
+        for text in doc_texts:
+            h.update(b"\0")
+            h.update(text.encode())
+        return h.digest()
+    
+    def _document_texts(self, documents: List[Dict[str, Any]]) -> List[str]:
+        """Extract text from documents, truncated to max_rerank_doc_tokens"""
+        # Cross-encoder cost grows with sequence length, so trim before sending
+        max_chars = self.settings.max_rerank_doc_tokens * _CHARS_PER_TOKEN
+        return [self._doc_text(doc, max_chars) for doc in documents]
+    
+    @staticmethod
+    def _doc_text(doc: Dict[str, Any], max_chars: int) -> str:
+        text = (doc.get("title") or "")[:max_chars]
+        description = doc.get("description")
+        if description and len(text) < max_chars:
+            # Slice before concatenating so long descriptions are never copied whole
+            text += " " + description[:max_chars - len(text) - 1]
+        return text
+    
+    @staticmethod
+    def _select_top(
+        documents: List[Dict[str, Any]],
+        scores: List[float],
+        top_n: int
+    ) -> Tuple[List[Dict[str, Any]], List[float]]:
+        """Return the top N documents by score (descending)"""
+        scores = np.asarray(scores, dtype=np.float64)
+        n = min(top_n, scores.size)
+        if n <= 0:
+            return [], []
+        
+        # O(N) partition for the top n, then sort only those n
+        top_idx = np.sort(np.argpartition(-scores, n - 1)[:n])
+        top_idx = top_idx[np.argsort(-scores[top_idx], kind="stable")]
+        
+        top_docs = [documents[i] for i in top_idx]
+        top_scores = scores[top_idx].tolist()
         
         return top_docs, top_scores
     
@@ -109,12 +276,84 @@ class RerankService:
         client = self._get_deepinfra_client()
         return client.rerank_sync(query, doc_texts)
     
+    def _predict(self, queries: List[str], texts: List[str], batch_size: int = 32):
+        """Score (queries[i], texts[i]) pairs with the local model"""
+        model = self._load_local_model()
+        if not self._torch_model:
+            return model.predict(list(zip(queries, texts)), batch_size=batch_size, show_progress_bar=False)
+        
+        import torch
+        
+        features = self._encode_pairs(model.tokenizer, queries, texts, model.max_length or 512)
+        
+        # Run the forward pass directly instead of through CrossEncoder.predict
+        device = model.model.device
+        autocast = (
+            torch.autocast("cuda", dtype=self._autocast_dtype)
+            if self._autocast_dtype is not None else contextlib.nullcontext()
+        )
+        scores = []
+        with torch.inference_mode(), autocast:
+            for start in range(0, len(features), batch_size):
+                encoded = model.tokenizer.pad(
+                    features[start:start + batch_size], return_tensors="pt"
+                ).to(device)
+                logits = model.model(**encoded).logits
+                # Same activation CrossEncoder.predict applies (sigmoid for one label)
+                scores.append(model.default_activation_function(logits)[:, 0].float().cpu())
+        return torch.cat(scores).numpy() if scores else []
+    
+    @staticmethod
+    def _encode_pairs(tokenizer, queries: List[str], texts: List[str], max_length: int) -> List[Dict[str, List[int]]]:
+        """
+        Token ids for each (query, text) pair, unpadded
+        
+        A request pairs one query with many documents, so each distinct query
+        is tokenized once and all documents in one batch call; the pairs are
+        then assembled from ids with the model's own special tokens.
+        """
+        query_ids = {
+            query: tokenizer(query, add_special_tokens=False, truncation=True, max_length=max_length // 2)["input_ids"]
+            for query in dict.fromkeys(queries)
+        }
+        doc_ids = tokenizer(texts, add_special_tokens=False)["input_ids"]
+        num_special = tokenizer.num_special_tokens_to_add(pair=True)
+        with_token_types = "token_type_ids" in tokenizer.model_input_names
+        
+        features = []
+        for query, ids in zip(queries, doc_ids):
+            q_ids = query_ids[query]
+            ids = ids[:max_length - num_special - len(q_ids)]  # Truncate the document only
+            feature = {"input_ids": tokenizer.build_inputs_with_special_tokens(q_ids, ids)}
+            if with_token_types:
+                feature["token_type_ids"] = tokenizer.create_token_type_ids_from_sequences(q_ids, ids)
+            features.append(feature)
+        return features
+    
     def _rerank_local(self, query: str, doc_texts: List[str]) -> List[float]:
         """Rerank using local model"""
-        model = self._load_local_model()
-        pairs = [[query, text] for text in doc_texts]
-        scores = model.predict(pairs, show_progress_bar=False)
-        return list(scores)
+        return np.asarray(self._predict([query] * len(doc_texts), doc_texts)).tolist()
+    
+    def _rerank_local_batch(self, requests: List[Tuple[str, List[str]]]) -> List[List[float]]:
+        """Score several (query, doc_texts) requests in one predict call"""
+        queries = [query for query, doc_texts in requests for _ in doc_texts]
+        texts = [text for _, doc_texts in requests for text in doc_texts]
+        # One C-level pass to Python floats instead of a list of numpy scalars
+        scores = np.asarray(self._predict(queries, texts, batch_size=64)).tolist()
+        
+        results = []
+        start = 0
+        for _, doc_texts in requests:
+            results.append(scores[start:start + len(doc_texts)])
+            start += len(doc_texts)
+        return results
+    
+    async def _arerank_local_batch(self, requests: List[Tuple[str, List[str]]]) -> List[List[float]]:
+        # The model runs in a worker thread to keep the event loop free
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="rerank")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._rerank_local_batch, requests)
 
 
 # Global instance
@@ -1,106 +1,156 @@
 """
 Qdrant search functionality
 """
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue, Range, PointStruct
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, Range, PointStruct,
+    SearchParams, QuantizationSearchParams, SearchRequest
+)
 import uuid
 
+import orjson
+
+from caching import LRUCache
 from config import get_settings
 from embeddings import get_embedding_service
+from qdrant_connection import get_async_qdrant_client, get_qdrant_client
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
+
+# Search the INT8-quantized vectors, then rescore an oversampled candidate set
+# with the original float32 vectors so ranking matches unquantized search
+_SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+
+# Search filter keys that affect the Qdrant filter, in a fixed order for cache keys
+_FILTER_KEYS = ("tenant_id", "level", "max_duration_min", "media_type", "provider")
+
+
+@lru_cache(maxsize=512)
+def _build_filter(filter_items: Tuple[Tuple[str, Any], ...]) -> Optional[Filter]:
+    """
+    Build the Qdrant filter for a search filter given as (key, value) pairs
+    
+    The same few filters (tenant, level) repeat across requests, so the
+    Filter objects are memoized; qdrant_client never mutates them.
+    """
+    search_filter = dict(filter_items)
+    if not search_filter:
+        # Default to global only if no filter provided? Or allow all?
+        # Safer to default to global for now if we want isolation by default.
+        return Filter(must=[FieldCondition(key="tenant_id", match=MatchValue(value="global"))])
+    
+    conditions = []
+    
+    # Tenant filter: (tenant_id = 'global' OR tenant_id = current_tenant)
+    tenant_id = search_filter.get("tenant_id") or "global"
+    if tenant_id == "global":
+        conditions.append(
+            FieldCondition(
+                key="tenant_id",
+                match=MatchValue(value="global")
+            )
+        )
+    else:
+        # OR condition
+        conditions.append(
+            Filter(
+                should=[
+                    FieldCondition(key="tenant_id", match=MatchValue(value="global")),
+                    FieldCondition(key="tenant_id", match=MatchValue(value=tenant_id))
+                ]
+            )
+        )
+    
+    # Level filter (less than or equal)
+    if search_filter.get("level") is not None:
+        conditions.append(
+            FieldCondition(
+                key="level",
+                range=Range(lte=search_filter["level"])
+            )
+        )
+    
+    # Duration filter (less than or equal)
+    if search_filter.get("max_duration_min"):
+        conditions.append(
+            FieldCondition(
+                key="duration_min",
+                range=Range(lte=search_filter["max_duration_min"])
+            )
+        )
+    
+    # Media type filter
+    if search_filter.get("media_type"):
+        conditions.append(
+            FieldCondition(
+                key="media_type",
+                match=MatchValue(value=search_filter["media_type"])
+            )
+        )
+    
+    # Provider filter
+    if search_filter.get("provider"):
+        conditions.append(
+            FieldCondition(
+                key="provider",
+                match=MatchValue(value=search_filter["provider"])
+            )
+        )
+    
+    if not conditions:
+        return None
+    
+    return Filter(must=conditions)
 
 
 class SearchService:
     """Service for searching resources in Qdrant"""
     
     def __init__(self):
+        self.settings = get_settings()
         self.client = None
+        self.aclient = None  # AsyncQdrantClient for asearch
         self.embedding_service = get_embedding_service()
+        # Formatted results for recent (query, filters, top_k); filters include
+        # the tenant, so tenants never share entries
+        self._result_cache = LRUCache(self.settings.search_cache_size, ttl=self.settings.search_cache_ttl)
     
     def connect(self):
         """Connect to Qdrant"""
         if self.client is None:
-            logger.info(f"Connecting to Qdrant at {settings.qdrant_url}")
-            self.client = QdrantClient(
-                url=settings.qdrant_url,
-                api_key=settings.qdrant_api_key,
-                timeout=30
-            )
+            self.client = get_qdrant_client()
+            self.aclient = get_async_qdrant_client()
             logger.info("Connected to Qdrant successfully")
     
     def build_filter(self, search_filter: Optional[Dict[str, Any]] = None) -> Optional[Filter]:
-        """Build Qdrant filter from search parameters"""
+        """Build Qdrant filter from search parameters (memoized; see _build_filter)"""
         if not search_filter:
-            # Default to global only if no filter provided? Or allow all?
-            # Safer to default to global for now if we want isolation by default.
-            return Filter(must=[FieldCondition(key="tenant_id", match=MatchValue(value="global"))])
-        
-        conditions = []
-        
-        # Tenant filter: (tenant_id = 'global' OR tenant_id = current_tenant)
-        tenant_id = search_filter.get("tenant_id", "global")
-        if tenant_id == "global":
-            conditions.append(
-                FieldCondition(
-                    key="tenant_id",
-                    match=MatchValue(value="global")
-                )
-            )
-        else:
-            # OR condition
-            conditions.append(
-                Filter(
-                    should=[
-                        FieldCondition(key="tenant_id", match=MatchValue(value="global")),
-                        FieldCondition(key="tenant_id", match=MatchValue(value=tenant_id))
-                    ]
-                )
-            )
-        
-        # Level filter (less than or equal)
-        if search_filter.get("level") is not None:
-            conditions.append(
-                FieldCondition(
-                    key="level",
-                    range=Range(lte=search_filter["level"])
-                )
-            )
-        
-        # Duration filter (less than or equal)
-        if search_filter.get("max_duration_min"):
-            conditions.append(
-                FieldCondition(
-                    key="duration_min",
-                    range=Range(lte=search_filter["max_duration_min"])
-                )
-            )
-        
-        # Media type filter
-        if search_filter.get("media_type"):
-            conditions.append(
-                FieldCondition(
-                    key="media_type",
-                    match=MatchValue(value=search_filter["media_type"])
-                )
-            )
-        
-        # Provider filter
-        if search_filter.get("provider"):
-            conditions.append(
-                FieldCondition(
-                    key="provider",
-                    match=MatchValue(value=search_filter["provider"])
-                )
-            )
-        
-        if not conditions:
-            return None
-        
-        return Filter(must=conditions)
+            return _build_filter(())
+        filter_items = tuple((key, search_filter.get(key)) for key in _FILTER_KEYS)
+        try:
+            return _build_filter(filter_items)
+        except TypeError:
+            # Unhashable value (e.g. a list); build it without caching
+            return _build_filter.__wrapped__(filter_items)
+    
+    def clear_cache(self):
+        """Drop cached search results"""
+        self._result_cache.clear()
+    
+    @staticmethod
+    def _result_key(query: str, filters: Optional[Dict[str, Any]], top_k: int) -> tuple:
+        return query, orjson.dumps(filters or {}, option=orjson.OPT_SORT_KEYS, default=str), top_k
+    
+    def _cached_results(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        # Callers update result dicts (e.g. rerank scores), so hand out copies
+        results = self._result_cache.get(key)
+        return None if results is None else [dict(r) for r in results]
     
     def search(
         self,
@@ -119,6 +169,11 @@ class SearchService:
         Returns:
             List of search results with scores
         """
+        cache_key = self._result_key(query, filters, top_k)
+        cached = self._cached_results(cache_key)
+        if cached is not None:
+            return cached
+        
         if self.client is None:
             self.connect()
         
@@ -134,35 +189,138 @@ class SearchService:
         # Search
         try:
             search_result = self.client.search(
-                collection_name=settings.qdrant_collection,
+                collection_name=self.settings.qdrant_collection,
                 query_vector=query_embedding,
                 query_filter=qdrant_filter,
                 limit=top_k,
+                search_params=_SEARCH_PARAMS,
                 with_payload=True
             )
-            
-            # Format results
-            results = []
-            for hit in search_result:
-                result = {
-                    "resource_id": hit.payload.get("resource_id") or str(hit.id),
-                    "title": hit.payload.get("title"),
-                    "url": hit.payload.get("url"),
-                    "provider": hit.payload.get("provider"),
-                    "license": hit.payload.get("license"),
-                    "duration_min": hit.payload.get("duration_min"),
-                    "level": hit.payload.get("level"),
-                    "skills": hit.payload.get("skills", []),
-                    "media_type": hit.payload.get("media_type"),
-                    "score": hit.score
-                }
-                results.append(result)
-            
+            results = self._format_results(search_result)
+        
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            raise
+        
+        self._result_cache.put(cache_key, [dict(r) for r in results])
+        return results
+    
+    def search_many(
+        self,
+        queries: List[str],
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 20
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one embedding call and one Qdrant request
+        
+        Returns one result list per query, in order. Cached queries are served
+        from the result cache; the rest are embedded together and sent with
+        search_batch.
+        """
+        keys = [self._result_key(query, filters, top_k) for query in queries]
+        results: List[Optional[List[Dict[str, Any]]]] = [self._cached_results(key) for key in keys]
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        if not missing:
             return results
         
+        if self.client is None:
+            self.connect()
+        
+        query_embeddings = self.embedding_service.generate_embeddings(
+            [queries[i] for i in missing],
+            instruction="query"
+        )
+        qdrant_filter = self.build_filter(filters)
+        
+        try:
+            batch_result = self.client.search_batch(
+                collection_name=self.settings.qdrant_collection,
+                requests=[
+                    SearchRequest(
+                        vector=embedding.tolist(),
+                        filter=qdrant_filter,
+                        limit=top_k,
+                        params=_SEARCH_PARAMS,
+                        with_payload=True
+                    )
+                    for embedding in query_embeddings
+                ]
+            )
+        except Exception as e:
+            logger.error(f"Batch search error: {e}")
+            raise
+        
+        for i, search_result in zip(missing, batch_result):
+            results[i] = self._format_results(search_result)
+            self._result_cache.put(keys[i], [dict(r) for r in results[i]])
+        return results
+    
+    async def asearch(
+        self,
+        query: str,
+        filters: Optional[Dict[str, Any]] = None,
+        top_k: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        Async version of search
+        
+        The query embedding is requested first so the API round-trip overlaps
+        with connecting and building the filter; Qdrant is queried with the
+        asyncio client, so no worker thread is tied up during the call.
+        """
+        cache_key = self._result_key(query, filters, top_k)
+        cached = self._cached_results(cache_key)
+        if cached is not None:
+            return cached
+        
+        embed_task = asyncio.create_task(
+            self.embedding_service.agenerate_single_embedding(query, instruction="query")
+        )
+        
+        if self.client is None:
+            self.connect()
+        qdrant_filter = self.build_filter(filters)
+        
+        query_embedding = await embed_task
+        
+        try:
+            search_result = await self.aclient.search(
+                collection_name=self.settings.qdrant_collection,
+                query_vector=query_embedding,
+                query_filter=qdrant_filter,
+                limit=top_k,
+                search_params=_SEARCH_PARAMS,
+                with_payload=True
+            )
+            results = self._format_results(search_result)
+        
         except Exception as e:
             logger.error(f"Search error: {e}")
             raise
+        
+        self._result_cache.put(cache_key, [dict(r) for r in results])
+        return results
+    
+    def _format_results(self, search_result) -> List[Dict[str, Any]]:
+        """Convert Qdrant hits into result dicts"""
+        results = []
+        for hit in search_result:
+            result = {
+                "resource_id": hit.payload.get("resource_id") or str(hit.id),
+                "title": hit.payload.get("title"),
+                "url": hit.payload.get("url"),
+                "provider": hit.payload.get("provider"),
+                "license": hit.payload.get("license"),
+                "duration_min": hit.payload.get("duration_min"),
+                "level": hit.payload.get("level"),
+                "skills": hit.payload.get("skills", []),
+                "media_type": hit.payload.get("media_type"),
+                "score": hit.score
+            }
+            results.append(result)
+        
+        return results
     
     def upsert_resource(
         self,
@@ -181,7 +339,7 @@ class SearchService:
         )
         
         self.client.upsert(
-            collection_name=settings.qdrant_collection,
+            collection_name=self.settings.qdrant_collection,
             points=[point]
         )
     
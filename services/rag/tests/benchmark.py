@@ -5,14 +5,28 @@ Performance benchmarks for Deep Infra services
 Run with: python tests/benchmark.py
 """
 import time
-import statistics
 import sys
 import os
 
+import numpy as np
+
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+def print_latency_stats(latencies: list, indent: str = "  "):
+    """Print mean/median/std/min/max and P95/P99 (linear interpolation) in ms"""
+    values = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    print(f"{indent}Mean:   {values.mean():>8.2f} ms")
+    print(f"{indent}Median: {p50:>8.2f} ms")
+    print(f"{indent}Std:    {values.std(ddof=1) if values.size > 1 else 0.0:>8.2f} ms")
+    print(f"{indent}Min:    {values.min():>8.2f} ms")
+    print(f"{indent}Max:    {values.max():>8.2f} ms")
+    print(f"{indent}P95:    {p95:>8.2f} ms")
+    print(f"{indent}P99:    {p99:>8.2f} ms")
+
+
 def benchmark_embeddings(n_iterations: int = 20, batch_sizes: list = [1, 5, 10]):
     """Benchmark embedding generation latency"""
     from embeddings import get_embedding_service
@@ -37,12 +51,7 @@ def benchmark_embeddings(n_iterations: int = 20, batch_sizes: list = [1, 5, 10])
             latencies.append((time.perf_counter() - start) * 1000)
         
         print(f"\nBatch size: {batch_size}")
-        print(f"  Mean:   {statistics.mean(latencies):>8.2f} ms")
-        print(f"  Median: {statistics.median(latencies):>8.2f} ms")
-        print(f"  Std:    {statistics.stdev(latencies):>8.2f} ms")
-        print(f"  Min:    {min(latencies):>8.2f} ms")
-        print(f"  Max:    {max(latencies):>8.2f} ms")
-        print(f"  P95:    {sorted(latencies)[int(n_iterations * 0.95)]:>8.2f} ms")
+        print_latency_stats(latencies)
 
 
 def benchmark_rerank(n_iterations: int = 20, doc_counts: list = [3, 5, 10, 20]):
@@ -69,17 +78,13 @@ def benchmark_rerank(n_iterations: int = 20, doc_counts: list = [3, 5, 10, 20]):
         service.rerank(query, docs[:3], top_n=3)
         
         for _ in range(n_iterations):
+            service.clear_cache()  # Measure scoring, not the score cache
             start = time.perf_counter()
             service.rerank(query, docs, top_n=min(5, doc_count))
             latencies.append((time.perf_counter() - start) * 1000)
         
         print(f"\nDocument count: {doc_count}")
-        print(f"  Mean:   {statistics.mean(latencies):>8.2f} ms")
-        print(f"  Median: {statistics.median(latencies):>8.2f} ms")
-        print(f"  Std:    {statistics.stdev(latencies):>8.2f} ms")
-        print(f"  Min:    {min(latencies):>8.2f} ms")
-        print(f"  Max:    {max(latencies):>8.2f} ms")
-        print(f"  P95:    {sorted(latencies)[int(n_iterations * 0.95)]:>8.2f} ms")
+        print_latency_stats(latencies)
 
 
 def benchmark_full_pipeline(n_iterations: int = 10):
@@ -113,6 +118,9 @@ def benchmark_full_pipeline(n_iterations: int = 10):
     rerank_service.rerank("warmup", docs[:2], top_n=2)
     
     for _ in range(n_iterations):
+        # Measure the model/API path, not the in-process caches
+        embed_service.clear_cache()
+        rerank_service.clear_cache()
         total_start = time.perf_counter()
         
         # Embed query
@@ -128,16 +136,13 @@ def benchmark_full_pipeline(n_iterations: int = 10):
         total_latencies.append((time.perf_counter() - total_start) * 1000)
     
     print(f"\nEmbed Query:")
-    print(f"  Mean: {statistics.mean(embed_latencies):.2f} ms")
-    print(f"  P95:  {sorted(embed_latencies)[int(n_iterations * 0.95)]:.2f} ms")
+    print_latency_stats(embed_latencies)
     
     print(f"\nRerank (5 docs):")
-    print(f"  Mean: {statistics.mean(rerank_latencies):.2f} ms")
-    print(f"  P95:  {sorted(rerank_latencies)[int(n_iterations * 0.95)]:.2f} ms")
+    print_latency_stats(rerank_latencies)
     
     print(f"\nTotal Pipeline:")
-    print(f"  Mean: {statistics.mean(total_latencies):.2f} ms")
-    print(f"  P95:  {sorted(total_latencies)[int(n_iterations * 0.95)]:.2f} ms")
+    print_latency_stats(total_latencies)
 
 
 def main():
@@ -0,0 +1,87 @@
+"""
+Shared fixtures for the RAG service tests
+"""
+import asyncio
+import httpx
+import orjson
+import pytest
+from functools import lru_cache
+
+
+def pytest_configure(config):
+    # Registered here so the mark is known even without pytest-xdist installed
+    config.addinivalue_line("markers", "xdist_group(name): run the marked tests on one xdist worker")
+
+
+class MockDeepInfraAPI:
+    """
+    Stands in for the Deep Infra HTTP API behind an httpx.MockTransport
+    
+    Every request is answered with `payload` as JSON and kept in `requests`;
+    payload may also be a function of the decoded request body.
+    """
+    
+    def __init__(self):
+        self.payload = {}
+        self.requests = []
+        self.client = None
+    
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        payload = self.payload
+        if callable(payload):
+            payload = payload(orjson.loads(request.content))
+        return httpx.Response(200, json=payload)
+    
+    def last_json(self):
+        """Decoded body of the most recent request"""
+        return orjson.loads(self.requests[-1].content)
+
+
+@pytest.fixture(scope="module")
+def deepinfra_api():
+    """Deep Infra settings and a DeepInfraClient on the mock API, set up once per module"""
+    import deepinfra_client
+    from config import get_settings
+    
+    api = MockDeepInfraAPI()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("USE_DEEPINFRA", "true")
+        mp.setenv("DEEPINFRA_API_KEY", "test-key")
+        get_settings.cache_clear()
+        
+        # MockTransport serves both the sync and the async client
+        transport = httpx.MockTransport(api.handle)
+        api.client = deepinfra_client.DeepInfraClient(transport=transport, async_transport=transport)
+        yield api
+    
+    asyncio.run(api.client.aclose())
+    deepinfra_client._client = None
+    get_settings.cache_clear()
+
+
+@pytest.fixture
+def mock_api(deepinfra_api):
+    """The module's mock API, installed as the client singleton with an empty request log"""
+    import deepinfra_client
+    
+    deepinfra_client._client = deepinfra_api.client
+    deepinfra_api.requests.clear()
+    return deepinfra_api
+
+
+@pytest.fixture(scope="session")
+def cached_embed():
+    """
+    Embed (instruction, text) through the live service, at most once per session
+    
+    Unlike the service's own cache this survives the singleton resets done by
+    other tests, so integration tests embedding the same text share one API call.
+    """
+    from embeddings import get_embedding_service
+    
+    @lru_cache(maxsize=256)
+    def embed(instruction: str, text: str):
+        return get_embedding_service().generate_single_embedding(text, instruction=instruction)
+    
+    return embed
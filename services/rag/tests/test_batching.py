@@ -0,0 +1,61 @@
+"""
+Unit tests for the async micro-batcher
+"""
+import asyncio
+import pytest
+
+from batching import AsyncBatcher
+
+
+class TestAsyncBatcher:
+    """Tests for AsyncBatcher"""
+
+    def test_coalesces_concurrent_calls(self):
+        """Test that concurrent submits are sent as one batch in order"""
+        calls = []
+
+        async def batch_fn(items):
+            calls.append(list(items))
+            return [item.upper() for item in items]
+
+        async def run():
+            batcher = AsyncBatcher(batch_fn, max_batch=8, max_wait_ms=20)
+            return await asyncio.gather(*(batcher.submit(t) for t in ["a", "b", "c"]))
+
+        results = asyncio.run(run())
+
+        assert results == ["A", "B", "C"]
+        assert calls == [["a", "b", "c"]]
+
+    def test_splits_at_max_batch(self):
+        """Test that batches never exceed max_batch items"""
+        calls = []
+
+        async def batch_fn(items):
+            calls.append(len(items))
+            return items
+
+        async def run():
+            batcher = AsyncBatcher(batch_fn, max_batch=2, max_wait_ms=20)
+            return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+        results = asyncio.run(run())
+
+        assert results == [0, 1, 2, 3, 4]
+        assert all(n <= 2 for n in calls)
+        assert sum(calls) == 5
+
+    def test_propagates_errors_to_all_callers(self):
+        """Test that a failed batch call raises in every waiting caller"""
+        async def batch_fn(items):
+            raise RuntimeError("API down")
+
+        async def run():
+            batcher = AsyncBatcher(batch_fn, max_batch=8, max_wait_ms=5)
+            return await asyncio.gather(
+                batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+
+        assert all(isinstance(r, RuntimeError) for r in results)
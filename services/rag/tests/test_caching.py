@@ -0,0 +1,44 @@
+"""
+Unit tests for the in-process LRU cache
+"""
+import pytest
+from unittest.mock import patch
+
+from caching import LRUCache
+
+
+class TestLRUCache:
+    """Tests for LRUCache"""
+    
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entry is evicted first"""
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+    
+    def test_entries_expire_after_ttl(self):
+        """Test that entries older than ttl are misses"""
+        cache = LRUCache(maxsize=4, ttl=10)
+        with patch("caching.time.monotonic", return_value=100.0):
+            cache.put("q", [0.5])
+        
+        with patch("caching.time.monotonic", return_value=105.0):
+            assert cache.get("q") == [0.5]
+        with patch("caching.time.monotonic", return_value=111.0):
+            assert cache.get("q") is None
+        assert cache.hits == 1
+        assert cache.misses == 1
+    
+    def test_zero_size_disables_cache(self):
+        """Test that maxsize=0 never stores anything"""
+        cache = LRUCache(maxsize=0)
+        cache.put("a", 1)
+        
+        assert cache.get("a") is None
+        assert len(cache) == 0
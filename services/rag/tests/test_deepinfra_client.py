@@ -1,289 +1,266 @@
 """
 Unit tests for Deep Infra client
 """
+import asyncio
+import copy
+import httpx
+import orjson
 import pytest
 from unittest.mock import patch, MagicMock
-import sys
 import os
+import time
+from contextlib import contextmanager
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import deepinfra_client
+import embeddings
+import rerank
+from config import get_settings
+from deepinfra_client import DeepInfraClient
+from embeddings import EmbeddingService
+from rerank import RerankService
 
 
 def reset_modules():
     """Reset all module singletons and caches"""
-    import deepinfra_client
-    import embeddings
-    import rerank
-    from config import get_settings
-    
     deepinfra_client._client = None
     embeddings._embedding_service = None
     rerank._rerank_service = None
     get_settings.cache_clear()
 
 
+@pytest.fixture
+def fresh_settings():
+    """For tests that patch their own environment; leaves no stale settings behind"""
+    reset_modules()
+    yield
+    reset_modules()
+
+
+@contextmanager
+def _mocked_rerank(scores, **env):
+    """
+    Yield a local-path RerankService whose stub model returns `scores`
+    
+    Extra keyword arguments are set as environment variables while the
+    service's settings are read; singletons are reset before and after.
+    """
+    reset_modules()
+    try:
+        with patch.dict(os.environ, {"USE_DEEPINFRA": "false", **env}, clear=False):
+            get_settings.cache_clear()
+            service = RerankService()
+            model = MagicMock()
+            model.predict.return_value = scores
+            service._load_local_model = MagicMock(return_value=model)
+            yield service
+    finally:
+        reset_modules()
+
+
 class TestDeepInfraClient:
     """Tests for DeepInfraClient"""
     
-    def test_client_requires_api_key(self):
+    def test_client_requires_api_key(self, fresh_settings):
         """Test that client raises error without API key"""
-        reset_modules()
-        
         with patch.dict(os.environ, {"USE_DEEPINFRA": "true", "DEEPINFRA_API_KEY": ""}, clear=False):
-            from config import get_settings
             get_settings.cache_clear()
             
-            from deepinfra_client import DeepInfraClient
             with pytest.raises(ValueError, match="DEEPINFRA_API_KEY is required"):
                 DeepInfraClient()
     
-    def test_embeddings_api_call(self):
-        """Test embedding generation makes correct API call"""
-        reset_modules()
+    @pytest.mark.parametrize("method, args, payload, expected", [
+        (
+            "generate_embeddings_sync",
+            (["test text"],),
+            {"embeddings": [[0.1, 0.2, 0.3] * 256]},  # 768 dimensions
+            [[0.1, 0.2, 0.3] * 256]
+        ),
+        (
+            "rerank_sync",
+            ("query", ["doc1", "doc2", "doc3"]),
+            {"scores": [0.95, 0.80, 0.60]},
+            [0.95, 0.80, 0.60]
+        ),
+    ])
+    def test_api_call(self, mock_api, method, args, payload, expected):
+        """Test each endpoint returns the parsed API response"""
+        mock_api.payload = payload
         
-        # Patch environment BEFORE importing/creating client
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            with patch('deepinfra_client.httpx.Client') as mock_client:
-                # Setup mock response
-                mock_response = MagicMock()
-                mock_response.json.return_value = {
-                    "embeddings": [[0.1, 0.2, 0.3] * 256]  # 768 dimensions
-                }
-                mock_response.raise_for_status = MagicMock()
-                mock_client.return_value.__enter__.return_value.post.return_value = mock_response
-                
-                from deepinfra_client import DeepInfraClient
-                client = DeepInfraClient()
-                result = client.generate_embeddings_sync(["test text"])
-                
-                assert len(result) == 1
-                assert len(result[0]) == 768
+        assert getattr(mock_api.client, method)(*args) == expected
     
-    def test_rerank_api_call(self):
-        """Test reranking makes correct API call"""
-        reset_modules()
+    def test_rerank_request_format(self, mock_api):
+        """Test rerank sends correct request format for Qwen model"""
+        mock_api.payload = {"scores": [0.5]}
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            with patch('deepinfra_client.httpx.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"scores": [0.95, 0.80, 0.60]}
-                mock_response.raise_for_status = MagicMock()
-                mock_client.return_value.__enter__.return_value.post.return_value = mock_response
-                
-                from deepinfra_client import DeepInfraClient
-                client = DeepInfraClient()
-                
-                scores = client.rerank_sync("query", ["doc1", "doc2", "doc3"])
-                
-                assert len(scores) == 3
-                assert scores[0] == 0.95
-                assert scores[1] == 0.80
+        client = mock_api.client
+        client.rerank_sync("my query", ["document text"])
+        
+        # Verify the request format
+        request = mock_api.requests[-1]
+        assert request.method == "POST"
+        assert str(request.url) == client.reranker_url
+        assert request.headers["Authorization"] == "Bearer test-key"
+        request_json = mock_api.last_json()
+        
+        assert "queries" in request_json
+        assert "documents" in request_json
+        assert request_json["queries"] == ["my query"]
+        assert request_json["documents"] == ["document text"]
     
-    def test_rerank_request_format(self):
-        """Test rerank sends correct request format for Qwen model"""
-        reset_modules()
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_rerank_concurrent_chunks(self, mock_api, workers):
+        """Test that chunked sync reranks return scores in document order"""
+        def score(body):
+            # Earlier chunks answer slower, so they finish last with several workers
+            first = int(body["documents"][0].split()[1])
+            time.sleep((20 - first) / 2000)
+            return {"scores": [float(doc.split()[1]) for doc in body["documents"]]}
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            with patch('deepinfra_client.httpx.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"scores": [0.5]}
-                mock_response.raise_for_status = MagicMock()
-                
-                mock_post = MagicMock(return_value=mock_response)
-                mock_client.return_value.__enter__.return_value.post = mock_post
-                
-                from deepinfra_client import DeepInfraClient
-                client = DeepInfraClient()
-                client.rerank_sync("my query", ["document text"])
-                
-                # Verify the request format
-                call_args = mock_post.call_args
-                request_json = call_args.kwargs.get('json') or call_args[1].get('json')
-                
-                assert "queries" in request_json
-                assert "documents" in request_json
-                assert request_json["queries"] == ["my query"]
-                assert request_json["documents"] == ["document text"]
+        mock_api.payload = score
+        client = DeepInfraClient(transport=httpx.MockTransport(mock_api.handle))
+        client.rerank_chunk_size = 8
+        client.rerank_chunk_workers = workers
+        
+        try:
+            scores = client.rerank_sync("query", [f"doc {i}" for i in range(20)])
+        finally:
+            client.close()
+        
+        assert scores == [float(i) for i in range(20)]
+        assert len(mock_api.requests) == 3
 
 
 class TestEmbeddingService:
     """Tests for EmbeddingService"""
     
-    def test_uses_deepinfra_when_enabled(self):
+    def test_uses_deepinfra_when_enabled(self, mock_api):
         """Test service uses Deep Infra API when enabled"""
-        reset_modules()
+        service = EmbeddingService()
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            from embeddings import EmbeddingService
-            service = EmbeddingService()
-            
-            assert service.use_deepinfra is True
+        assert service.use_deepinfra is True
     
-    def test_uses_local_when_disabled(self):
+    def test_uses_local_when_disabled(self, fresh_settings):
         """Test service uses local model when Deep Infra disabled"""
-        reset_modules()
-        
         with patch.dict(os.environ, {"USE_DEEPINFRA": "false"}, clear=False):
-            from config import get_settings
             get_settings.cache_clear()
             
-            from embeddings import EmbeddingService
             service = EmbeddingService()
             
             assert service.use_deepinfra is False
     
-    def test_adds_instruction_prefix(self):
+    def test_adds_instruction_prefix(self, mock_api):
         """Test that instruction prefix is added correctly"""
-        reset_modules()
+        mock_api.payload = {"embeddings": [[0.1] * 768]}
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            with patch('deepinfra_client.httpx.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"embeddings": [[0.1] * 768]}
-                mock_response.raise_for_status = MagicMock()
-                
-                mock_post = MagicMock(return_value=mock_response)
-                mock_client.return_value.__enter__.return_value.post = mock_post
-                
-                from embeddings import EmbeddingService
-                import deepinfra_client
-                deepinfra_client._client = None
-                
-                service = EmbeddingService()
-                
-                # Test query instruction
-                service.generate_embeddings(["test"], instruction="query")
-                call_args = mock_post.call_args
-                request_json = call_args.kwargs.get('json') or call_args[1].get('json')
-                assert request_json["inputs"][0].startswith("query: ")
-                
-                # Test passage instruction
-                service.generate_embeddings(["test"], instruction="passage")
-                call_args = mock_post.call_args
-                request_json = call_args.kwargs.get('json') or call_args[1].get('json')
-                assert request_json["inputs"][0].startswith("passage: ")
+        service = EmbeddingService()
+        
+        # Test query instruction
+        service.generate_embeddings(["test"], instruction="query")
+        assert mock_api.last_json()["inputs"][0].startswith("query: ")
+        
+        # Test passage instruction
+        service.generate_embeddings(["test"], instruction="passage")
+        assert mock_api.last_json()["inputs"][0].startswith("passage: ")
+    
+    @pytest.mark.parametrize("batch_size", [8, 64, 256])
+    def test_splits_large_inputs_into_batches(self, mock_api, batch_size):
+        """Test that inputs are sent batch_size texts per request and reassembled in order"""
+        # Each text embeds to its own index, so the order of the result is checkable
+        mock_api.payload = lambda body: {
+            "embeddings": [[float(text.rsplit(" ", 1)[1])] for text in body["inputs"]]
+        }
+        texts = [f"text {i}" for i in range(200)]
+        
+        service = EmbeddingService(batch_size=batch_size)
+        vectors = service.generate_embeddings(texts)
+        
+        assert len(mock_api.requests) == -(-len(texts) // batch_size)
+        assert all(len(orjson.loads(r.content)["inputs"]) <= batch_size for r in mock_api.requests)
+        assert vectors.shape == (200, 1)
+        assert vectors[:, 0].tolist() == list(range(200))
+    
+    def test_single_embedding_cache_is_case_sensitive(self, mock_api):
+        """Test that texts differing only in case are embedded separately, whitespace aside"""
+        mock_api.payload = lambda body: {"embeddings": [[float(len(mock_api.requests))]]}
+        
+        service = EmbeddingService()
+        upper = service.generate_single_embedding("Python  basics", instruction="query")
+        spaced = service.generate_single_embedding(" Python basics ", instruction="query")
+        lower = service.generate_single_embedding("python basics", instruction="query")
+        
+        assert len(mock_api.requests) == 2
+        assert spaced is upper
+        assert lower.tolist() != upper.tolist()
 
 
 class TestRerankService:
     """Tests for RerankService"""
     
-    def test_rerank_sorts_by_score(self):
-        """Test that rerank returns documents sorted by score"""
-        reset_modules()
+    @pytest.mark.parametrize("top_n, expected_titles, expected_scores", [
+        (3, ["Doc B", "Doc C", "Doc A"], [0.9, 0.6, 0.3]),
+        (2, ["Doc B", "Doc C"], [0.9, 0.6]),
+    ])
+    def test_rerank_sorts_by_score(self, top_n, expected_titles, expected_scores):
+        """Test that the top_n documents are returned sorted by score"""
+        docs = [{"title": "Doc A"}, {"title": "Doc B"}, {"title": "Doc C"}]
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            with patch('deepinfra_client.httpx.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"scores": [0.3, 0.9, 0.6]}
-                mock_response.raise_for_status = MagicMock()
-                mock_client.return_value.__enter__.return_value.post.return_value = mock_response
-                
-                from rerank import RerankService
-                import deepinfra_client
-                deepinfra_client._client = None
-                
-                service = RerankService()
-                
-                docs = [
-                    {"title": "Doc A", "description": "First"},
-                    {"title": "Doc B", "description": "Second"},
-                    {"title": "Doc C", "description": "Third"},
-                ]
-                
-                results, scores = service.rerank("query", docs, top_n=3)
-                
-                # Should be sorted by score descending
-                assert results[0]["title"] == "Doc B"  # score 0.9
-                assert results[1]["title"] == "Doc C"  # score 0.6
-                assert results[2]["title"] == "Doc A"  # score 0.3
-                assert scores == [0.9, 0.6, 0.3]
-    
-    def test_rerank_respects_top_n(self):
-        """Test that rerank returns only top_n results"""
-        reset_modules()
+        results, scores = RerankService._select_top(docs, [0.3, 0.9, 0.6], top_n)
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            with patch('deepinfra_client.httpx.Client') as mock_client:
-                mock_response = MagicMock()
-                mock_response.json.return_value = {"scores": [0.3, 0.9, 0.6]}
-                mock_response.raise_for_status = MagicMock()
-                mock_client.return_value.__enter__.return_value.post.return_value = mock_response
-                
-                from rerank import RerankService
-                import deepinfra_client
-                deepinfra_client._client = None
-                
-                service = RerankService()
-                
-                docs = [
-                    {"title": "Doc A"},
-                    {"title": "Doc B"},
-                    {"title": "Doc C"},
-                ]
-                
-                results, scores = service.rerank("query", docs, top_n=2)
-                
-                assert len(results) == 2
-                assert len(scores) == 2
+        assert [d["title"] for d in results] == expected_titles
+        assert scores == expected_scores
     
     def test_rerank_empty_documents(self):
-        """Test rerank handles empty document list"""
-        reset_modules()
+        """Test that selecting from no documents returns nothing"""
+        assert RerankService._select_top([], [], 5) == ([], [])
+    
+    def test_rerank_scores_with_model(self):
+        """Test that rerank scores documents with the model and returns the top_n"""
+        docs = [{"title": "Doc A"}, {"title": "Doc B"}, {"title": "Doc C"}]
         
-        with patch.dict(os.environ, {
-            "USE_DEEPINFRA": "true",
-            "DEEPINFRA_API_KEY": "test-key"
-        }, clear=False):
-            from config import get_settings
-            get_settings.cache_clear()
-            
-            from rerank import RerankService
-            service = RerankService()
-            
-            results, scores = service.rerank("query", [], top_n=5)
+        with _mocked_rerank([0.3, 0.9, 0.6]) as service:
+            results, scores = service.rerank("query", docs, top_n=2)
+        
+        assert [d["title"] for d in results] == ["Doc B", "Doc C"]
+        assert scores == [0.9, 0.6]
+    
+    @pytest.mark.parametrize("top_n", [1, 5], ids=["scored", "passthrough"])
+    def test_rerank_leaves_documents_unchanged(self, top_n):
+        """Test that rerank adds nothing to the caller's documents"""
+        docs = [{"title": "Doc A", "description": "about a", "score": 0.8}, {"title": "Doc B", "score": 0.6}]
+        original = copy.deepcopy(docs)
+        
+        with _mocked_rerank([0.3, 0.9], RERANK_SKIP_WHEN_SMALL="true") as service:
+            results, _ = service.rerank("query", docs, top_n=top_n)
+        
+        assert docs == original
+        assert all(result in original for result in results)
+    
+    def test_concurrent_local_reranks_share_one_predict_call(self):
+        """Test that concurrent async reranks are scored in one model call"""
+        # Pairs reach the model in request order: a, ccc (q1), then bb (q2)
+        with _mocked_rerank([1.0, 3.0, 2.0]) as service:
+            async def run():
+                return await asyncio.gather(
+                    service.arerank("q1", [{"title": "a"}, {"title": "ccc"}], top_n=2),
+                    service.arerank("q2", [{"title": "bb"}], top_n=1),
+                )
             
-            assert results == []
-            assert scores == []
+            (docs1, scores1), (docs2, scores2) = asyncio.run(run())
+            model = service._load_local_model.return_value
+        
+        assert model.predict.call_count == 1
+        assert [text for _, text in model.predict.call_args.args[0]] == ["a", "ccc", "bb"]
+        assert [d["title"] for d in docs1] == ["ccc", "a"]
+        assert scores1 == [3.0, 1.0]
+        assert scores2 == [2.0]
+    
+    def test_rerank_skips_model_when_small(self):
+        """Test that rerank passes small candidate lists through when enabled"""
+        docs = [{"title": "a", "score": 0.8}, {"title": "b", "score": 0.6}]
+        
+        with _mocked_rerank([], RERANK_SKIP_WHEN_SMALL="true") as service:
+            results, scores = service.rerank("query", docs, top_n=5)
+        
+        service._load_local_model.assert_not_called()
+        assert results == docs
+        assert scores == [0.8, 0.6]
@@ -3,24 +3,33 @@ Integration tests for Deep Infra services
 These tests require a valid DEEPINFRA_API_KEY environment variable
 
 Run with: pytest tests/test_integration.py -v -s
+(or in parallel with the rest of the suite: pytest -n 8 --dist loadgroup)
 """
+import asyncio
 import pytest
+import numpy as np
 import os
-import sys
+from concurrent.futures import ThreadPoolExecutor
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Skip all tests if no API key; under pytest-xdist they share one worker
+# (and so one pooled client) while the unit tests run on the others
+pytestmark = [
+    pytest.mark.skipif(
+        not os.environ.get("DEEPINFRA_API_KEY"),
+        reason="DEEPINFRA_API_KEY not set"
+    ),
+    pytest.mark.xdist_group("deepinfra"),
+]
 
-# Skip all tests if no API key
-pytestmark = pytest.mark.skipif(
-    not os.environ.get("DEEPINFRA_API_KEY"),
-    reason="DEEPINFRA_API_KEY not set"
-)
 
-
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session", autouse=True)
 def reset_singletons():
-    """Reset all singletons before each test"""
+    """
+    Start from fresh singletons once; the tests then share them
+    
+    The Deep Infra path is stateless, so one client and one set of services
+    serves every test here instead of being rebuilt (and settings re-read) per test.
+    """
     import embeddings
     import rerank
     import deepinfra_client
@@ -33,28 +42,62 @@ def reset_singletons():
     
     yield
     
-    # Cleanup after test
-    embeddings._embedding_service = None
-    rerank._rerank_service = None
-    deepinfra_client._client = None
-    get_settings.cache_clear()
+    # The async client's connections belong to the per-test event loops, which
+    # are closed by now; only the sync side needs releasing
+    if deepinfra_client._client is not None:
+        deepinfra_client._client.close()
+        deepinfra_client._client = None
+
+
+# Document corpus for the end-to-end pipeline tests
+PIPELINE_CORPUS = [
+    {"title": "Python Basics", "description": "Learn Python from scratch"},
+    {"title": "Advanced Python", "description": "Master Python programming"},
+    {"title": "JavaScript Intro", "description": "Web development basics"},
+    {"title": "Machine Learning", "description": "ML with Python and TensorFlow"},
+    {"title": "Cooking 101", "description": "Basic cooking techniques"},
+]
+PIPELINE_QUERY = "How to learn Python programming"
+
+
+def top_candidates(query_embedding, corpus_embeddings, k: int = 3):
+    """
+    Top k corpus documents by cosine similarity, best first
+    
+    One matrix-vector product over the L2-normalized corpus, then a partial
+    (O(N)) top-k selection with only those k sorted.
+    """
+    corpus_matrix = np.asarray(corpus_embeddings, dtype=np.float32)
+    corpus_matrix = corpus_matrix / np.linalg.norm(corpus_matrix, axis=1, keepdims=True)
+    query_vector = query_embedding / np.linalg.norm(query_embedding)
+    
+    similarities = corpus_matrix @ query_vector
+    k = min(k, similarities.size)
+    top_indices = np.argpartition(-similarities, k - 1)[:k]
+    top_indices = top_indices[np.argsort(-similarities[top_indices])]
+    
+    print(f"\nTop {k} by embedding similarity:")
+    for idx in top_indices:
+        print(f"  {similarities[idx]:.4f} - {PIPELINE_CORPUS[idx]['title']}")
+    
+    return [PIPELINE_CORPUS[i] for i in top_indices]
 
 
 class TestEmbeddingsIntegration:
     """Integration tests for embedding service"""
     
-    def test_generate_single_embedding(self):
+    def test_generate_single_embedding(self, cached_embed):
         """Test generating a single embedding"""
         from embeddings import get_embedding_service
         
         service = get_embedding_service()
         assert service.use_deepinfra is True
         
-        embedding = service.generate_single_embedding("Hello, world!")
+        embedding = cached_embed("passage", "Hello, world!")
         
-        assert isinstance(embedding, list)
-        assert len(embedding) == 768
-        assert all(isinstance(x, float) for x in embedding)
+        assert isinstance(embedding, np.ndarray)
+        assert embedding.dtype == np.float32
+        assert embedding.shape == (768,)
     
     def test_generate_batch_embeddings(self):
         """Test generating embeddings for multiple texts"""
@@ -70,38 +113,52 @@ class TestEmbeddingsIntegration:
         
         embeddings = service.generate_embeddings(texts)
         
-        assert len(embeddings) == 3
-        assert all(len(emb) == 768 for emb in embeddings)
+        assert embeddings.shape == (3, 768)
     
-    def test_query_vs_passage_embeddings_differ(self):
-        """Test that query and passage embeddings are different"""
-        from embeddings import get_embedding_service
+    @pytest.mark.parametrize("batch_size", [8, 64])
+    def test_generate_large_batch(self, batch_size):
+        """Test that inputs larger than one request are split and reassembled"""
+        from embeddings import EmbeddingService
         
-        service = get_embedding_service()
+        service = EmbeddingService(batch_size=batch_size)
+        texts = [f"text {i}" for i in range(200)]
+        
+        embeddings = service.generate_embeddings(texts)
+        
+        assert embeddings.shape == (200, 768)
+    
+    def test_query_vs_passage_embeddings_differ(self, cached_embed):
+        """Test that query and passage embeddings are different"""
         text = "Python programming tutorial"
         
-        query_emb = service.generate_single_embedding(text, instruction="query")
-        passage_emb = service.generate_single_embedding(text, instruction="passage")
+        # Independent calls: issue both requests at once
+        with ThreadPoolExecutor(2) as pool:
+            query_emb, passage_emb = pool.map(
+                lambda instruction: cached_embed(instruction, text),
+                ["query", "passage"]
+            )
         
         # They should be different due to different prefixes
-        assert query_emb != passage_emb
+        assert not np.array_equal(query_emb, passage_emb)
     
     def test_similar_texts_have_high_similarity(self):
         """Test that semantically similar texts have high cosine similarity"""
-        import numpy as np
         from embeddings import get_embedding_service
         
         service = get_embedding_service()
         
-        emb1 = service.generate_single_embedding("Python programming language")
-        emb2 = service.generate_single_embedding("Python coding tutorial")
-        emb3 = service.generate_single_embedding("Cooking pasta recipe")
+        # One API call for all three texts
+        embeddings = service.generate_embeddings([
+            "Python programming language",
+            "Python coding tutorial",
+            "Cooking pasta recipe"
+        ])
         
-        def cosine_similarity(a, b):
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+        # Normalize once; cosine similarity is then a plain dot product
+        emb1, emb2, emb3 = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
         
-        sim_related = cosine_similarity(emb1, emb2)
-        sim_unrelated = cosine_similarity(emb1, emb3)
+        sim_related = float(emb1 @ emb2)
+        sim_unrelated = float(emb1 @ emb3)
         
         print(f"\nSimilarity (Python vs Python tutorial): {sim_related:.4f}")
         print(f"Similarity (Python vs Cooking): {sim_unrelated:.4f}")
@@ -179,42 +236,21 @@ class TestEndToEnd:
         """Test the full embed -> search -> rerank pipeline"""
         from embeddings import get_embedding_service
         from rerank import get_rerank_service
-        import numpy as np
         
         embed_service = get_embedding_service()
         rerank_service = get_rerank_service()
         
-        # Simulate document corpus
-        corpus = [
-            {"title": "Python Basics", "description": "Learn Python from scratch"},
-            {"title": "Advanced Python", "description": "Master Python programming"},
-            {"title": "JavaScript Intro", "description": "Web development basics"},
-            {"title": "Machine Learning", "description": "ML with Python and TensorFlow"},
-            {"title": "Cooking 101", "description": "Basic cooking techniques"},
-        ]
-        
-        # 1. Embed corpus
-        corpus_texts = [f"{d['title']} {d['description']}" for d in corpus]
-        corpus_embeddings = embed_service.generate_embeddings(corpus_texts, instruction="passage")
-        
-        # 2. Embed query
-        query = "How to learn Python programming"
-        query_embedding = embed_service.generate_single_embedding(query, instruction="query")
+        # 1-2. Embed the query and the corpus in one call (row 0 is the query)
+        corpus_texts = [f"passage: {d['title']} {d['description']}" for d in PIPELINE_CORPUS]
+        embeddings = embed_service.generate_embeddings(
+            [f"query: {PIPELINE_QUERY}"] + corpus_texts, already_prefixed=True
+        )
         
         # 3. Find top candidates by cosine similarity
-        def cosine_similarity(a, b):
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-        
-        similarities = [cosine_similarity(query_embedding, emb) for emb in corpus_embeddings]
-        top_indices = np.argsort(similarities)[::-1][:3]  # Top 3
-        candidates = [corpus[i] for i in top_indices]
-        
-        print("\nTop 3 by embedding similarity:")
-        for i, idx in enumerate(top_indices):
-            print(f"  {similarities[idx]:.4f} - {corpus[idx]['title']}")
+        candidates = top_candidates(embeddings[0], embeddings[1:])
         
         # 4. Rerank candidates
-        reranked, scores = rerank_service.rerank(query, candidates, top_n=3)
+        reranked, scores = rerank_service.rerank(PIPELINE_QUERY, candidates, top_n=3)
         
         print("\nAfter reranking:")
         for doc, score in zip(reranked, scores):
@@ -222,3 +258,26 @@ class TestEndToEnd:
         
         # Verify Python docs are at the top
         assert "Python" in reranked[0]["title"]
+    
+    def test_embed_and_rerank_pipeline_async(self):
+        """Test the pipeline on the async path, embedding query and corpus concurrently"""
+        from embeddings import get_embedding_service
+        from rerank import get_rerank_service
+        
+        embed_service = get_embedding_service()
+        rerank_service = get_rerank_service()
+        
+        async def run():
+            # The two embeddings are independent, so their requests overlap
+            corpus_texts = [f"{d['title']} {d['description']}" for d in PIPELINE_CORPUS]
+            corpus_embeddings, query_embedding = await asyncio.gather(
+                embed_service.agenerate_embeddings(corpus_texts, instruction="passage"),
+                embed_service.agenerate_single_embedding(PIPELINE_QUERY, instruction="query")
+            )
+            candidates = top_candidates(query_embedding, corpus_embeddings)
+            return await rerank_service.arerank(PIPELINE_QUERY, candidates, top_n=3)
+        
+        reranked, scores = asyncio.run(run())
+        
+        assert len(reranked) == 3
+        assert "Python" in reranked[0]["title"]
@@ -0,0 +1,202 @@
+"""
+Unit tests for the ingestion helpers in main
+"""
+import pytest
+from unittest.mock import MagicMock
+
+# main pulls in every service dependency (FastAPI, boto3, psycopg2, ...)
+main = pytest.importorskip("main")
+
+
+# Body text outside div/article/main, plus chrome with nested divs
+PAGE_WITHOUT_CONTAINERS = b"""<!DOCTYPE html>
+<html>
+<head>
+  <title> Intro to Graphs </title>
+  <meta name="description" content="Graph basics for beginners">
+  <script>var tracking = "SCRIPT TEXT";</script>
+  <style>body { color: red; }</style>
+</head>
+<body>
+  <header><div class="logo">HEADER CHROME</div></header>
+  <nav><div><a href="/">NAV CHROME</a></div></nav>
+  <section>
+    <h1>Graphs</h1>
+    <p>A graph is a set of vertices connected by edges, used to model networks of all kinds.</p>
+    <p>Breadth-first search visits vertices in order of their distance from the start vertex.</p>
+    <ul><li>Adjacency lists store neighbours per vertex.</li><li>Adjacency matrices use V squared space.</li></ul>
+    <pre>def bfs(graph, start): ...</pre>
+  </section>
+  <aside><div>ASIDE CHROME</div></aside>
+  <footer><div>FOOTER CHROME</div></footer>
+</body>
+</html>"""
+
+PAGE_WITH_ARTICLE = b"""<html><head><title>Sorting</title>
+<meta property="og:description" content="Sorting algorithms compared"></head>
+<body><div class="sidebar">SIDEBAR TEXT</div>
+<article><h1>Sorting</h1><p>Merge sort splits the input in half, sorts both halves recursively and merges
+them, giving O(n log n) time in every case.</p><div><p>Quicksort partitions around a pivot and is
+usually faster in practice.</p><script>ignored()</script></div></article></body></html>"""
+
+
+class TestParsePage:
+    """Tests for parse_page"""
+    
+    @pytest.mark.parametrize("html", [PAGE_WITHOUT_CONTAINERS, PAGE_WITH_ARTICLE], ids=["sections", "article"])
+    def test_matches_baseline_parser(self, monkeypatch, html):
+        """Test that lxml extracts the same text and metadata as html.parser"""
+        result = main.parse_page(html)
+        
+        monkeypatch.setattr(main, "_HTML_PARSER", "html.parser")
+        assert result == main.parse_page(html)
+    
+    def test_keeps_body_text_and_drops_chrome(self):
+        """Test that text outside div containers is kept and nav/footer chrome is removed"""
+        result = main.parse_page(PAGE_WITHOUT_CONTAINERS)
+        
+        assert result["title"] == "Intro to Graphs"
+        assert result["description"] == "Graph basics for beginners"
+        for text in ["Breadth-first search", "Adjacency lists", "def bfs"]:
+            assert text in result["content"]
+        for text in ["HEADER", "NAV", "ASIDE", "FOOTER", "SCRIPT TEXT", "color: red"]:
+            assert text not in result["content"]
+    
+    def test_prefers_article_content(self):
+        """Test that an article's text is used over the rest of the page"""
+        result = main.parse_page(PAGE_WITH_ARTICLE)
+        
+        assert result["description"] == "Sorting algorithms compared"
+        assert "Quicksort partitions" in result["content"]
+        assert "SIDEBAR" not in result["content"]
+        assert "ignored()" not in result["content"]
+
+
+class TestCopyField:
+    """Tests for _copy_field"""
+    
+    @pytest.mark.parametrize("value, expected", [
+        (None, ''),
+        ("plain", '"plain"'),
+        ('say "hi"', '"say ""hi"""'),
+        (["a1", "b2"], '"{""a1"",""b2""}"'),
+        (['x,y', 'q"z', 'back\\slash', None], '"{""x,y"",""q\\""z"",""back\\\\slash"",NULL}"'),
+    ], ids=["null", "text", "quotes", "uuids", "array-escaping"])
+    def test_formats_csv_field(self, value, expected):
+        """Test that values and array elements are quoted for COPY ... csv"""
+        assert main._copy_field(value) == expected
+
+
+class TestStoreResources:
+    """Tests for store_resources"""
+    
+    URL = "https://example.com/graphs"
+    EXISTING_ID = "0b5f2d0e-5a52-4c1f-9a1e-1f5d3c9b7a11"
+    
+    def test_uploads_snippet_under_existing_row_id(self, monkeypatch):
+        """Test that a re-ingested URL stores its snippet under the id kept by the upsert"""
+        uploads = []
+        updates = []
+        
+        def upload_to_s3(content, resource_id):
+            uploads.append((content, resource_id))
+            return main.snippet_key(resource_id)
+        
+        monkeypatch.setattr(main, "get_db_connection", MagicMock)
+        monkeypatch.setattr(main, "release_db_connection", lambda conn: None)
+        monkeypatch.setattr(main, "get_skill_map", lambda cur, slugs: {})
+        # The URL already exists, so the upsert returns the old row's id
+        monkeypatch.setattr(main, "upsert_rows", lambda *args, **kwargs: [{"id": self.EXISTING_ID, "url": self.URL}])
+        monkeypatch.setattr(main, "upload_to_s3", upload_to_s3)
+        monkeypatch.setattr(main, "execute_values", lambda cur, sql, rows: updates.append(rows))
+        
+        request = main.IngestResourcesRequest(
+            resources=[main.Resource(title="Graphs", url=self.URL)],
+            generate_embeddings=False
+        )
+        extracted = {"title": None, "description": None, "estimated_duration_min": None, "content": "Graph basics"}
+        response = main.store_resources(request, {self.URL: extracted})
+        
+        assert response.success == 1
+        assert uploads == [("Graph basics", self.EXISTING_ID)]
+        assert updates == [[(self.EXISTING_ID, main.snippet_key(self.EXISTING_ID))]]
+
+
+class TestIngestSkillsEndpoint:
+    """Tests for POST /ingest/skills"""
+    
+    def test_stores_tenant_ids(self, monkeypatch):
+        """Test that skills are upserted with their tenant, defaulting to global"""
+        from fastapi.testclient import TestClient
+        
+        upserts = []
+        lookups = []
+        
+        def upsert_rows(cur, table, columns, rows, on_conflict, template=None):
+            upserts.append((columns, rows))
+            return [{"id": row[0], "slug": row[2]} for row in rows]
+        
+        monkeypatch.setattr(main, "get_db_connection", MagicMock)
+        monkeypatch.setattr(main, "release_db_connection", lambda conn: None)
+        monkeypatch.setattr(main, "get_skill_map", lambda cur, slugs: lookups.append(slugs) or {})
+        monkeypatch.setattr(main, "update_skill_map", lambda skills: None)
+        monkeypatch.setattr(main, "upsert_rows", upsert_rows)
+        monkeypatch.setattr(main, "execute_values", MagicMock())
+        
+        # Not entered as a context manager, so the lifespan's service setup is skipped
+        client = TestClient(main.app)
+        response = client.post("/ingest/skills", json={"skills": [
+            {"name": "Graphs", "slug": "graphs"},
+            {"name": "BFS", "slug": "bfs", "prerequisites": ["graphs"], "tenant_id": "acme"}
+        ]})
+        
+        assert response.status_code == 200
+        assert response.json()["success"] == 2
+        columns, rows = upserts[0]
+        tenants = {row[columns.index("slug")]: row[columns.index("tenant_id")] for row in rows}
+        assert tenants == {"graphs": "global", "bfs": "acme"}
+        # "graphs" is defined in the request itself, so it is not looked up
+        assert lookups == [[]]
+
+
+class FakeSkillCursor:
+    """Cursor returning fixed skill rows; records whether the map lock was held"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+        self.locked_during_query = False
+    
+    def execute(self, sql):
+        self.queries += 1
+        self.locked_during_query = main._skill_map_lock.locked()
+    
+    def fetchall(self):
+        return self.rows
+
+
+class TestGetSkillMap:
+    """Tests for get_skill_map"""
+    
+    @pytest.fixture(autouse=True)
+    def empty_cache(self, monkeypatch):
+        monkeypatch.setattr(main, "_skill_map", {})
+        monkeypatch.setattr(main, "_skill_map_loaded", False)
+    
+    def test_reloads_outside_lock_then_serves_from_cache(self):
+        """Test that the first call queries without holding the lock and later calls hit the cache"""
+        cur = FakeSkillCursor([{"id": "id-graphs", "slug": "graphs"}])
+        
+        assert main.get_skill_map(cur, ["graphs"]) == {"graphs": "id-graphs"}
+        assert main.get_skill_map(cur, ["graphs"]) == {"graphs": "id-graphs"}
+        assert cur.queries == 1
+        assert not cur.locked_during_query
+    
+    def test_unknown_slug_forces_reload(self):
+        """Test that a slug missing from the cache reloads the whole map"""
+        cur = FakeSkillCursor([{"id": "id-graphs", "slug": "graphs"}])
+        main.get_skill_map(cur, [])
+        cur.rows = cur.rows + [{"id": "id-bfs", "slug": "bfs"}]
+        
+        assert main.get_skill_map(cur, ["bfs"]) == {"graphs": "id-graphs", "bfs": "id-bfs"}
+        assert cur.queries == 2